@@ -0,0 +1,176 @@
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import requests
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from config import ATTACHMENT_STREAM_LIMIT, ATTACHMENT_CHUNK_SIZE
+from config import ATTACHMENT_SMALL_WORKERS, ATTACHMENT_LARGE_WORKERS, ATTACHMENT_LARGE_BYTES, ATTACHMENT_PROGRESS_MB
+from utils import log_message
+from utils import log_event
+from metrics import count_bytes
+from metrics import record_bytes
+from journal import journal
+from trello_api import download_attachment
+from planka_api import transliterate_filename
+from planka_api import convert_to_trello_timezone
+from planka_backend import add_attachment
+from planka_backend import add_attachment_stream
+from planka_backend import update_card_cover
+from planka_backend import record
+
+ADD_DATE_TO_FILENAME = True  # Flag: True - add date to file name, False - leave original name
+MAX_FILENAME_LENGTH = 200
+
+# Function: returns the name of an attachment in Planka (transliterated, optionally with the original creation date added), or None if it is too long
+def attachment_file_name(attachment):
+    raw_file_name = attachment.get("name") or urllib.parse.unquote(attachment.get("fileName", "attachment"))
+    if len(raw_file_name) > MAX_FILENAME_LENGTH:
+        raw_file_name = raw_file_name[:MAX_FILENAME_LENGTH] + "..."
+    file_name_translit = transliterate_filename(raw_file_name)
+    created_at = attachment.get("date", None)
+
+    # Add the date to the file name if the flag is enabled
+    if ADD_DATE_TO_FILENAME and created_at:
+        try:
+            date_str = f"(created_at_{convert_to_trello_timezone(created_at, 'Europe/Moscow')})" # Select the timezone you're in
+            base, ext = os.path.splitext(file_name_translit)
+            file_name_translit = f"{base}_{date_str}{ext}"
+        except ValueError:
+            log_message(f"Date processing error {created_at} for file {file_name_translit}, leave original name", "WARNING")
+
+    if len(file_name_translit) > 255:
+        log_message(f"Error: File ‘{raw_file_name}’ has exceeded the file name length limit after processing and will be skipped", "ERROR")
+        return None
+    return file_name_translit
+
+# Function: passes the chunks of a large file through, logging its progress every ATTACHMENT_PROGRESS_MB
+def progress_chunks(chunks, file_name, size):
+    done = logged = 0
+    for chunk in chunks:
+        done += len(chunk)
+        if done - logged >= ATTACHMENT_PROGRESS_MB * 1024 * 1024:
+            logged = done
+            log_message(f"Attachment {file_name}: {done / 1024 / 1024:.0f} of {size / 1024 / 1024:.0f} MB ({done * 100 // size}%)")
+        yield chunk
+
+# Function: saves a downloaded attachment to a temporary file and uploads it from there (the file is always removed)
+def upload_through_file(card_id_planka, response, file_name, created_at):
+    with tempfile.NamedTemporaryFile() as f:
+        for chunk in count_bytes(response.iter_content(chunk_size=ATTACHMENT_CHUNK_SIZE), "attachment_download"):
+            f.write(chunk)
+        f.flush()
+        attachment = add_attachment(card_id_planka, f.name, created_at, file_name)
+        record_bytes("attachment_upload", f.tell())
+        return attachment
+
+# Function: pipes an attachment from the Trello download into the Planka upload with bounded memory. Files larger than
+# ATTACHMENT_STREAM_LIMIT or of unknown size, and files whose streamed upload failed, go through a temporary file
+def transfer_attachment(card_id_planka, card_id_trello, attachment_id, raw_file_name, file_name, created_at):
+    with download_attachment(card_id_trello, attachment_id, raw_file_name) as r:
+        size = r.headers.get("Content-Length")
+        if not size or int(size) > ATTACHMENT_STREAM_LIMIT or r.headers.get("Content-Encoding"):
+            return upload_through_file(card_id_planka, r, file_name, created_at)
+        try:
+            chunks = count_bytes(count_bytes(r.iter_content(chunk_size=ATTACHMENT_CHUNK_SIZE), "attachment_download"), "attachment_upload")
+            if int(size) >= ATTACHMENT_LARGE_BYTES:
+                chunks = progress_chunks(chunks, file_name, int(size))
+            return add_attachment_stream(card_id_planka, file_name, chunks, int(size), created_at)
+        except requests.exceptions.RequestException as e:
+            log_message(f"Streamed upload of {file_name} failed ({e}), retrying through a temporary file", "WARNING")
+
+    with download_attachment(card_id_trello, attachment_id, raw_file_name) as r:
+        return upload_through_file(card_id_planka, r, file_name, created_at)
+
+# Schedules the attachment transfers of the cards on two lanes: small files on a wide lane, files of ATTACHMENT_LARGE_BYTES or more
+# (and of unknown size) on a narrow one, so a big video never holds up the small files behind it
+class AttachmentScheduler:
+    def __init__(self):
+        self.small_lane = None
+        self.large_lane = None
+        self.lock = threading.Lock()
+
+    # Function: starts the lanes (a worker process keeps them for its whole life)
+    def start(self):
+        self.small_lane = ThreadPoolExecutor(max_workers=ATTACHMENT_SMALL_WORKERS)
+        self.large_lane = ThreadPoolExecutor(max_workers=ATTACHMENT_LARGE_WORKERS)
+
+    # Function: waits for the scheduled transfers
+    def shutdown(self):
+        self.small_lane.shutdown()
+        self.large_lane.shutdown()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    # Function: transfers one attachment of a card (run on a lane); returns its Planka id, or None if it has not been transferred
+    def transfer(self, card_id_planka, card_id_trello, attachment):
+        attachment_id = attachment["id"]
+        planka_attachment_id = journal.lookup("attachment", attachment_id)
+        if planka_attachment_id:
+            log_event("attachment", attachment_id, planka_attachment_id, 0, "skipped") # uploaded by a previous run
+            return planka_attachment_id
+        if not attachment.get("isUpload", True):
+            log_message(f"The attachment {attachment.get('url')} is a link, Planka cannot store it", "WARNING")
+            log_event("attachment", attachment_id, None, 0, "link")
+            return None
+
+        file_name = attachment_file_name(attachment)
+        if file_name is None:
+            return None
+        raw_file_name = attachment.get("name") or urllib.parse.unquote(attachment.get("fileName", "attachment"))
+        created_at = attachment.get("date", None)
+
+        started = time.monotonic()
+        try:
+            planka_attachment = transfer_attachment(card_id_planka, card_id_trello, attachment_id, raw_file_name, file_name, created_at)
+        except requests.exceptions.RequestException as e:
+            log_event("attachment", attachment_id, None, time.monotonic() - started, "failed")
+            log_message(f"Loading error in Planka {file_name}: {e}", "ERROR")
+            return None
+
+        record("attachment", attachment_id, planka_attachment["id"])
+        log_event("attachment", attachment_id, planka_attachment["id"], time.monotonic() - started, "created", bytes=attachment.get("bytes"))
+        log_message(f"The attachment {file_name} has been uploaded to the card", "DEBUG")
+        return planka_attachment["id"]
+
+    # Function: schedules the attachments of a card on their lanes and returns a future that completes once they are all transferred
+    # and the card cover is set (the cover is the Planka copy of the Trello cover attachment)
+    def submit_card(self, card_id_planka, card_trello):
+        card_future = Future()
+        attachments = card_trello.get("attachments", [])
+        if not attachments:
+            log_message("There are no attachments for the card, nothing has been uploaded", "DEBUG")
+            card_future.set_result(None)
+            return card_future
+
+        futures = {}
+        remaining = [len(attachments)]
+
+        def finished(_):
+            with self.lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                planka_attachments = {attachment_id: future.result() for attachment_id, future in futures.items()}
+                update_card_cover(card_id_planka, planka_attachments.get(card_trello.get("idAttachmentCover")))
+                card_future.set_result(None)
+            except Exception as e:
+                card_future.set_exception(e)
+
+        for attachment in attachments:
+            size = attachment.get("bytes")
+            lane = self.small_lane if size is not None and size < ATTACHMENT_LARGE_BYTES else self.large_lane
+            futures[attachment["id"]] = lane.submit(self.transfer, card_id_planka, card_trello["id"], attachment)
+        for future in list(futures.values()):
+            future.add_done_callback(finished)
+        return card_future
+
+attachment_scheduler = AttachmentScheduler()
\ No newline at end of file
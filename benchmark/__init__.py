@@ -0,0 +1 @@
+# Benchmark of the migration against local stand-ins of the Trello and Planka APIs (see benchmark/run.py)
\ No newline at end of file
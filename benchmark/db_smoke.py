@@ -0,0 +1,99 @@
+# Smoke run of the database backend (PLANKA_BACKEND = "database") against a local Planka 1.x database: a synthetic account is
+# migrated from the fake Trello server straight into PostgreSQL, the written rows are counted and the result is checked with --verify.
+# A throwaway Planka creates the schema and the admin user on its first start:
+#   docker network create planka-smoke
+#   docker run -d --name planka-smoke-db --network planka-smoke -p 5432:5432 -e POSTGRES_DB=planka -e POSTGRES_HOST_AUTH_METHOD=trust postgres:16-alpine
+#   docker run -d --name planka-smoke --network planka-smoke -p 3000:1337 -e BASE_URL=http://localhost:3000 -e SECRET_KEY=smoke \
+#     -e DATABASE_URL=postgresql://postgres@planka-smoke-db/planka -e DEFAULT_ADMIN_EMAIL=admin@example.com -e DEFAULT_ADMIN_PASSWORD=admin \
+#     -e DEFAULT_ADMIN_NAME=Admin -e DEFAULT_ADMIN_USERNAME=admin ghcr.io/plankanban/planka:1.26.1
+#   pip install psycopg2-binary
+#   python -m benchmark.db_smoke --database-url postgresql://postgres@localhost:5432/planka --user admin
+# The imported projects can then be opened at http://localhost:3000 (admin / admin); docker rm -f planka-smoke planka-smoke-db removes everything
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import config
+from benchmark.fake_servers import FakeTrello
+from benchmark.synthetic import generate_trello_data
+from http_client import trello_client
+
+# Tables written by the migration and the synthetic objects expected in them
+EXPECTED_ROWS = {
+    "board": lambda args: args.workspaces * args.boards,
+    "list": lambda args: args.workspaces * args.boards * args.lists,
+    "card": lambda args: args.workspaces * args.boards * args.lists * args.cards,
+    "task": lambda args: args.workspaces * args.boards * args.lists * args.cards * args.checklists * args.check_items,
+    "action": lambda args: args.workspaces * args.boards * args.lists * args.cards * args.comments,
+    "attachment": lambda args: args.workspaces * args.boards * args.lists * args.cards * args.attachments,
+}
+
+# Function: reads the smoke run options (the database, the Planka user and the size of the synthetic account)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smoke run of the database backend against a local Planka 1.x PostgreSQL database")
+    parser.add_argument("--database-url", required=True, help="PostgreSQL URL of the Planka database")
+    parser.add_argument("--user", default=config.USERNAME, help="Planka user the objects are created by")
+    parser.add_argument("--attachments-dir", help="attachment directory of Planka (a temporary directory by default)")
+    parser.add_argument("--batch-size", type=int, default=config.PLANKA_DATABASE_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--workspaces", type=int, default=1)
+    parser.add_argument("--boards", type=int, default=2, help="boards per workspace")
+    parser.add_argument("--lists", type=int, default=3, help="lists per board")
+    parser.add_argument("--cards", type=int, default=20, help="cards per list")
+    parser.add_argument("--comments", type=int, default=2, help="comments per card")
+    parser.add_argument("--checklists", type=int, default=1, help="checklists per card")
+    parser.add_argument("--check-items", type=int, default=3, help="items per checklist")
+    parser.add_argument("--attachments", type=int, default=1, help="uploaded attachments per card")
+    parser.add_argument("--attachment-size", type=int, default=4 * 1024, help="bytes per attachment")
+    parser.add_argument("--labels", type=int, default=4, help="labels per board")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes of the migration")
+    return parser.parse_args()
+
+# Function: returns the number of rows of the tables written by the migration
+def count_rows(planka_database):
+    return {table: planka_database.query(f'SELECT count(*) AS rows FROM "{table}"')[0]["rows"] for table in EXPECTED_ROWS}
+
+# Function: migrates a synthetic account into the database, verifies it and returns the report
+def run_smoke(args):
+    # the backend is chosen and configured when the migration modules are imported, so they are imported only now
+    config.PLANKA_BACKEND = "database"
+    config.PLANKA_DATABASE_URL = args.database_url
+    config.PLANKA_DATABASE_BATCH_SIZE = args.batch_size
+    config.PLANKA_ATTACHMENTS_DIR = args.attachments_dir or tempfile.mkdtemp(prefix="planka_attachments_")
+    config.USERNAME = args.user
+    from planka_db import planka_database
+    from migrators import migrate_workspaces
+    from snapshot import crawl_trello
+    from verify import verify_workspaces
+
+    data = generate_trello_data(args.workspaces, args.boards, args.lists, args.cards, args.comments, args.checklists, args.check_items,
+                                args.attachments, args.attachment_size, args.labels)
+    trello = FakeTrello(data, latency=0)
+    trello_client.base_url = trello.start() + "/1/"
+    try:
+        planka_database.open()
+        before = count_rows(planka_database)
+        with tempfile.TemporaryDirectory() as directory:
+            journal_path = os.path.join(directory, "journal.sqlite3")
+            started = time.monotonic()
+            migrate_workspaces(journal_path=journal_path, processes=args.processes)
+            wall_time = time.monotonic() - started
+            after = count_rows(planka_database)
+            results = verify_workspaces(crawl_trello(), journal_path)
+    finally:
+        trello.stop()
+
+    return {
+        "wall_time_sec": round(wall_time, 3),
+        "rows_written": {table: after[table] - before[table] for table in EXPECTED_ROWS},
+        "rows_expected": {table: expected(args) for table, expected in EXPECTED_ROWS.items()},
+        "verify_problems": sum(len(problems) for _, problems in results),
+        "attachments_dir": config.PLANKA_ATTACHMENTS_DIR,
+    }
+
+if __name__ == "__main__":
+    report = run_smoke(parse_args())
+    print(json.dumps(report, indent=2))
+    if report["verify_problems"] or report["rows_written"] != report["rows_expected"]:
+        sys.exit(1)
\ No newline at end of file
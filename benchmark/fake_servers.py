@@ -0,0 +1,375 @@
+import hashlib
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+# Base of the fake servers: a threaded HTTP server with a route table, configurable latency, a rate limit that answers 429
+# and random failures that answer 503. Every request is counted by method and route
+class FakeServer:
+    def __init__(self, latency=0.0, rate_limit=None, rate_window=1.0, failure_rate=0.0, seed=1):
+        self.latency = latency
+        self.rate_limit = rate_limit # requests per rate_window seconds, None for no limit
+        self.rate_window = rate_window
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_started = time.monotonic()
+        self.window_count = 0
+        self.request_counts = {}
+        self.throttled = 0
+        self.failed = 0
+        self.routes = []
+        self.server = None
+
+    # Function: adds a handler for requests matching the method and path pattern
+    def route(self, method, pattern, handler):
+        self.routes.append((method, re.compile(f"^{pattern}$"), handler))
+
+    # Function: starts the server on a free local port in a background thread and returns its base URL
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle_request(self, method):
+                fake.dispatch(self, method)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def do_PATCH(self):
+                self.handle_request("PATCH")
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                if not isinstance(sys.exc_info()[1], ConnectionError): # clients that drop a connection (a failed streamed upload) are expected
+                    super().handle_error(request, client_address)
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    # Function: returns the total number of requests received
+    def total_requests(self):
+        with self.lock:
+            return sum(self.request_counts.values())
+
+    # Function: applies the rate limit; returns the extra headers of a 429 answer, or None if the request may proceed
+    def check_rate_limit(self):
+        if not self.rate_limit:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_started >= self.rate_window:
+                self.window_started = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.window_count <= self.rate_limit:
+                return None
+            self.throttled += 1
+            return {"Retry-After": str(max(1, int(self.rate_window - (now - self.window_started) + 0.999)))}
+
+    def dispatch(self, handler, method):
+        parsed = urllib.parse.urlsplit(handler.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        for route_method, pattern, route_handler in self.routes:
+            match = pattern.match(parsed.path)
+            if route_method == method and match:
+                break
+        else:
+            self.read_body(handler)
+            return self.send_json(handler, 404, {"message": f"No route {method} {parsed.path}"})
+
+        with self.lock:
+            key = f"{method} {pattern.pattern[1:-1]}"
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        throttle_headers = self.check_rate_limit()
+        if throttle_headers is not None:
+            self.read_body(handler)
+            return self.send_json(handler, 429, {"message": "Too many requests"}, throttle_headers)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            with self.lock:
+                self.failed += 1
+            self.read_body(handler)
+            return self.send_json(handler, 503, {"message": "Injected failure"})
+
+        route_handler(handler, query, *match.groups())
+
+    # Function: reads the request body (in chunks, counting its size) and returns it, or only its size if keep is False
+    def read_body(self, handler, keep=True):
+        length = int(handler.headers.get("Content-Length") or 0)
+        chunks = []
+        read = 0
+        while read < length:
+            chunk = handler.rfile.read(min(64 * 1024, length - read))
+            if not chunk:
+                break
+            read += len(chunk)
+            if keep or not chunks:
+                chunks.append(chunk)
+        return b"".join(chunks) if keep else (chunks[0] if chunks else b"", read)
+
+    def read_json(self, handler):
+        body = self.read_body(handler)
+        return json.loads(body) if body else {}
+
+    def send_json(self, handler, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+# Stand-in of the Trello REST API endpoints used by trello_api.py, serving data from benchmark/synthetic.py.
+# The rate limit answers 429 with Trello's x-rate-limit headers instead of Retry-After
+class FakeTrello(FakeServer):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("rate_window", 10.0)
+        super().__init__(**kwargs)
+        self.data = data
+        self.route("GET", "/1/members/me/organizations", self.get_organizations)
+        self.route("GET", r"/1/organizations/(\w+)/boards", self.get_boards)
+        self.route("GET", r"/1/boards/(\w+)", self.get_board)
+        self.route("GET", r"/1/boards/(\w+)/cards", self.get_board_cards)
+        self.route("GET", r"/1/boards/(\w+)/actions", self.get_board_actions)
+        self.route("GET", r"/1/cards/(\w+)/attachments/(\w+)/download/(.+)", self.download_attachment)
+
+    def check_rate_limit(self):
+        headers = super().check_rate_limit()
+        if headers is not None:
+            return {"x-rate-limit-api-token-remaining": "0", "x-rate-limit-api-token-interval-ms": str(int(self.rate_window * 1000))}
+        return None
+
+    # Function: answers like send_json, with an ETag of the body and 304 Not Modified when the client already has it
+    def send_json(self, handler, status, payload, headers=None):
+        etag = '"' + hashlib.md5(json.dumps(payload).encode("utf-8")).hexdigest() + '"'
+        if status == 200 and handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        super().send_json(handler, status, payload, {**(headers or {}), "ETag": etag} if status == 200 else headers)
+
+    def card_fields(self, card, with_attachments=True):
+        return card if with_attachments else {key: value for key, value in card.items() if key != "attachments"}
+
+    def page_actions(self, actions, query):
+        if query.get("filter", "all") != "all":
+            actions = [action for action in actions if action["type"] in query["filter"].split(",")]
+        if "before" in query:
+            actions = [action for action in actions if action["id"] < query["before"]]
+        if "since" in query:
+            actions = [action for action in actions if action["date"] > query["since"]]
+        return actions[:int(query.get("limit", 50))]
+
+    def get_organizations(self, handler, query):
+        self.send_json(handler, 200, self.data["organizations"])
+
+    def get_boards(self, handler, query, org_id):
+        boards = [{"id": board["id"], "name": board["name"], "idOrganization": org_id, "closed": False, "dateLastActivity": board["dateLastActivity"]}
+                  for board in self.data["boards_by_org"].get(org_id, [])]
+        self.send_json(handler, 200, boards)
+
+    def get_board(self, handler, query, board_id):
+        board = self.data["boards"].get(board_id)
+        if not board:
+            return self.send_json(handler, 404, {"message": "The requested resource was not found."})
+        result = {"id": board["id"], "name": board["name"]}
+        if query.get("lists"):
+            result["lists"] = board["lists"]
+        if query.get("cards"):
+            result["cards"] = [self.card_fields(card, query.get("card_attachments") == "true") for card in board["cards"]]
+        if query.get("checklists"):
+            result["checklists"] = board["checklists"]
+        if query.get("labels"):
+            result["labels"] = board["labels"]
+        self.send_json(handler, 200, result)
+
+    def get_board_cards(self, handler, query, board_id):
+        cards = sorted(self.data["boards"][board_id]["cards"], key=lambda card: card["id"], reverse=True)
+        if "before" in query:
+            cards = [card for card in cards if card["id"] < query["before"]]
+        if "limit" in query:
+            cards = cards[:int(query["limit"])]
+        cards = [self.card_fields(card, query.get("attachments") == "true") for card in cards]
+        if query.get("checklists") == "all":
+            card_ids = {card["id"] for card in cards}
+            checklists = {}
+            for checklist in self.data["boards"][board_id]["checklists"]:
+                if checklist["idCard"] in card_ids:
+                    checklists.setdefault(checklist["idCard"], []).append(checklist)
+            cards = [{**card, "checklists": checklists.get(card["id"], [])} for card in cards]
+        self.send_json(handler, 200, cards)
+
+    def get_board_actions(self, handler, query, board_id):
+        self.send_json(handler, 200, self.page_actions(self.data["boards"][board_id]["actions"], query))
+
+    def download_attachment(self, handler, query, card_id, attachment_id, file_name):
+        size = self.data["attachment_sizes"].get(attachment_id)
+        if size is None:
+            return self.send_json(handler, 404, {"message": "Attachment not found"})
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/octet-stream")
+        handler.send_header("Content-Length", str(size))
+        handler.end_headers()
+        block = (attachment_id.encode("ascii") * (64 * 1024 // 24 + 1))[:64 * 1024]
+        sent = 0
+        while sent < size:
+            handler.wfile.write(block[:min(len(block), size - sent)])
+            sent += min(len(block), size - sent)
+
+# Stand-in of the Planka REST API endpoints used by planka_api.py. Created objects are kept in memory, so a benchmark
+# can check what was migrated. With token_ttl, bearer tokens expire after that many requests and the server answers 401
+class FakePlanka(FakeServer):
+    def __init__(self, token_ttl=None, **kwargs):
+        super().__init__(**kwargs)
+        self.ids = itertools.count(1000)
+        self.token_ttl = token_ttl
+        self.tokens = {}
+        self.items = {kind: {} for kind in ("project", "board", "list", "card", "task", "label", "cardLabel", "action", "attachment")}
+        self.uploaded_bytes = 0
+        self.route("POST", "/api/access-tokens", self.create_token)
+        self.route("POST", "/api/projects", self.create_project)
+        self.route("POST", r"/api/projects/(\d+)/boards", self.create_child("board", "projectId"))
+        self.route("GET", r"/api/boards/(\d+)", self.get_board)
+        self.route("POST", r"/api/boards/(\d+)/lists", self.create_child("list", "boardId"))
+        self.route("POST", r"/api/boards/(\d+)/labels", self.create_child("label", "boardId"))
+        self.route("POST", r"/api/lists/(\d+)/cards", self.create_child("card", "listId"))
+        self.route("PATCH", r"/api/cards/(\d+)", self.update_item("card"))
+        self.route("PATCH", r"/api/lists/(\d+)", self.update_item("list"))
+        self.route("PATCH", r"/api/tasks/(\d+)", self.update_item("task"))
+        self.route("PATCH", r"/api/comment-actions/(\d+)", self.update_item("action"))
+        self.route("POST", r"/api/cards/(\d+)/tasks", self.create_child("task", "cardId"))
+        self.route("POST", r"/api/cards/(\d+)/labels", self.create_child("cardLabel", "cardId"))
+        self.route("POST", r"/api/cards/(\d+)/comment-actions", self.create_child("action", "cardId", type="commentCard"))
+        self.route("GET", r"/api/cards/(\d+)/actions", self.get_card_actions)
+        self.route("POST", r"/api/cards/(\d+)/attachments", self.create_attachment)
+
+    def new_item(self, kind, fields):
+        item = {"id": str(next(self.ids)), **fields}
+        with self.lock:
+            self.items[kind][item["id"]] = item
+        return item
+
+    def authorised(self, handler):
+        token = (handler.headers.get("Authorization") or "").removeprefix("Bearer ")
+        with self.lock:
+            if token not in self.tokens:
+                return False
+            self.tokens[token] += 1
+            if self.token_ttl and self.tokens[token] > self.token_ttl:
+                del self.tokens[token]
+                return False
+        return True
+
+    def unauthorised(self, handler):
+        self.read_body(handler)
+        self.send_json(handler, 401, {"code": "E_UNAUTHORIZED", "message": "Access token is expired"})
+
+    def create_token(self, handler, query):
+        self.read_json(handler)
+        token = f"token{next(self.ids)}"
+        with self.lock:
+            self.tokens[token] = 0
+        self.send_json(handler, 200, {"item": token})
+
+    def create_project(self, handler, query):
+        if not self.authorised(handler):
+            return self.unauthorised(handler)
+        self.send_json(handler, 200, {"item": self.new_item("project", self.read_json(handler))})
+
+    def create_child(self, kind, parent_field, **extra):
+        def create(handler, query, parent_id):
+            if not self.authorised(handler):
+                return self.unauthorised(handler)
+            payload = self.read_json(handler)
+            if kind == "action":
+                payload = {"data": {"text": payload.get("text")}}
+            self.send_json(handler, 200, {"item": self.new_item(kind, {**payload, parent_field: parent_id, **extra})})
+        return create
+
+    def update_item(self, kind):
+        def update(handler, query, item_id):
+            if not self.authorised(handler):
+                return self.unauthorised(handler)
+            payload = self.read_json(handler)
+            if kind == "action":
+                payload = {"data": {"text": payload.get("text")}}
+            with self.lock:
+                item = self.items[kind].get(item_id)
+                if item is not None:
+                    item.update(payload)
+            if item is None:
+                return self.send_json(handler, 404, {"message": f"{kind} not found"})
+            self.send_json(handler, 200, {"item": item})
+        return update
+
+    def create_attachment(self, handler, query, card_id):
+        if not self.authorised(handler):
+            return self.unauthorised(handler)
+        head, size = self.read_body(handler, keep=False)
+        match = re.search(rb'filename="([^"]*)"', head)
+        with self.lock:
+            self.uploaded_bytes += size
+        item = self.new_item("attachment", {"cardId": card_id, "name": match.group(1).decode("utf-8") if match else "file", "size": size})
+        self.send_json(handler, 200, {"item": item})
+
+    def get_board(self, handler, query, board_id):
+        if not self.authorised(handler):
+            return self.unauthorised(handler)
+        with self.lock:
+            board = self.items["board"].get(board_id)
+            lists = [item for item in self.items["list"].values() if item["boardId"] == board_id]
+            list_ids = {item["id"] for item in lists}
+            cards = [item for item in self.items["card"].values() if item["listId"] in list_ids]
+            card_ids = {item["id"] for item in cards}
+            included = {
+                "lists": lists,
+                "cards": cards,
+                "labels": [item for item in self.items["label"].values() if item["boardId"] == board_id],
+                "cardLabels": [item for item in self.items["cardLabel"].values() if item["cardId"] in card_ids],
+                "tasks": [item for item in self.items["task"].values() if item["cardId"] in card_ids],
+                "attachments": [item for item in self.items["attachment"].values() if item["cardId"] in card_ids]
+            }
+        if board is None:
+            return self.send_json(handler, 404, {"message": "Board not found"})
+        self.send_json(handler, 200, {"item": board, "included": included})
+
+    def get_card_actions(self, handler, query, card_id):
+        if not self.authorised(handler):
+            return self.unauthorised(handler)
+        with self.lock:
+            actions = [item for item in self.items["action"].values() if item["cardId"] == card_id]
+        self.send_json(handler, 200, {"items": list(reversed(actions))})
+
+    # Function: returns the number of created objects of each kind
+    def created_counts(self):
+        with self.lock:
+            return {kind: len(items) for kind, items in self.items.items()}
\ No newline at end of file
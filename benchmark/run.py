@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from benchmark.fake_servers import FakeTrello
+from benchmark.fake_servers import FakePlanka
+from benchmark.synthetic import generate_trello_data
+from http_client import trello_client
+from http_client import planka_client
+from rate_limiter import trello_bucket
+from rate_limiter import planka_bucket
+from migrators import migrate_workspaces
+
+# Function: reads the benchmark options (size of the synthetic account and behaviour of the fake servers)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of a full migrate_workspaces run against local fake Trello and Planka servers")
+    parser.add_argument("--workspaces", type=int, default=1)
+    parser.add_argument("--boards", type=int, default=2, help="boards per workspace")
+    parser.add_argument("--lists", type=int, default=5, help="lists per board")
+    parser.add_argument("--cards", type=int, default=50, help="cards per list")
+    parser.add_argument("--comments", type=int, default=2, help="comments per card")
+    parser.add_argument("--checklists", type=int, default=1, help="checklists per card")
+    parser.add_argument("--check-items", type=int, default=3, help="items per checklist")
+    parser.add_argument("--attachments", type=int, default=1, help="uploaded attachments per card")
+    parser.add_argument("--link-attachments", type=int, default=0, help="link attachments per card")
+    parser.add_argument("--attachment-size", type=int, default=64 * 1024, help="bytes per attachment")
+    parser.add_argument("--labels", type=int, default=4, help="labels per board")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every fake server response")
+    parser.add_argument("--trello-rate-limit", type=int, default=None, help="requests per 10 seconds before the fake Trello answers 429")
+    parser.add_argument("--planka-rate-limit", type=int, default=None, help="requests per second before the fake Planka answers 429")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--token-ttl", type=int, default=None, help="requests after which a Planka token expires (401)")
+    parser.add_argument("--client-rate", type=float, default=None, help="override the request rate of both client buckets (requests per second)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes of the migration")
+    parser.add_argument("--stream", action="store_true", help="stream the boards page by page instead of reading them in advance")
+    parser.add_argument("--output", metavar="JSON", help="also write the report to a JSON file")
+    return parser.parse_args()
+
+# Function: runs one full migration against fresh fake servers and returns the report
+def run_benchmark(args):
+    data = generate_trello_data(args.workspaces, args.boards, args.lists, args.cards, args.comments, args.checklists, args.check_items,
+                                args.attachments, args.attachment_size, args.labels, args.link_attachments)
+    trello = FakeTrello(data, latency=args.latency, rate_limit=args.trello_rate_limit, failure_rate=args.failure_rate)
+    planka = FakePlanka(token_ttl=args.token_ttl, latency=args.latency, rate_limit=args.planka_rate_limit, failure_rate=args.failure_rate)
+    trello_client.base_url = trello.start() + "/1/"
+    planka_client.base_url = planka.start() + "/api"
+    if args.client_rate:
+        for bucket in (trello_bucket, planka_bucket):
+            bucket.set_rate(args.client_rate)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.monotonic()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            migrate_workspaces(journal_path=os.path.join(directory, "journal.sqlite3"), processes=args.processes, stream=args.stream)
+    finally:
+        wall_time = time.monotonic() - started
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        trello.stop()
+        planka.stop()
+
+    return {
+        "wall_time_sec": round(wall_time, 3),
+        "trello_requests": trello.total_requests(),
+        "planka_requests": planka.total_requests(),
+        "trello_requests_by_route": trello.request_counts,
+        "planka_requests_by_route": planka.request_counts,
+        "throttled": {"trello": trello.throttled, "planka": planka.throttled},
+        "injected_failures": {"trello": trello.failed, "planka": planka.failed},
+        "planka_created": planka.created_counts(),
+        "uploaded_bytes": planka.uploaded_bytes,
+        "peak_python_memory_mb": round(peak / 1024 / 1024, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2) # includes the fake servers and their data
+    }
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmark(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
\ No newline at end of file
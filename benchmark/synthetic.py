@@ -0,0 +1,71 @@
+import itertools
+import random
+
+TRELLO_COLORS = ["green", "yellow", "orange", "red", "purple", "blue", "sky", "pink", "black", "lime"]
+
+# Function: generates a synthetic Trello account in the shape served by the fake Trello server
+# (workspaces -> boards with lists, cards, checklists, labels, comment actions and attachments of the given size)
+def generate_trello_data(workspaces=1, boards=2, lists=5, cards=100, comments=2, checklists=1, check_items=3,
+                         attachments=1, attachment_size=64 * 1024, labels=4, link_attachments=0, seed=1):
+    rng = random.Random(seed)
+    counter = itertools.count(1)
+
+    def new_id():
+        return f"{next(counter):024x}" # increasing like real Trello ids, so "before" paging works
+
+    data = {"organizations": [], "boards_by_org": {}, "boards": {}, "attachment_sizes": {}}
+    for w in range(workspaces):
+        org = {"id": new_id(), "name": f"workspace{w}", "displayName": f"Workspace {w}"}
+        data["organizations"].append(org)
+        data["boards_by_org"][org["id"]] = []
+
+        for b in range(boards):
+            board = {"id": new_id(), "name": f"Board {w}.{b}", "idOrganization": org["id"], "closed": False,
+                     "dateLastActivity": "2024-01-01T00:00:00.000Z", "lists": [], "cards": [], "checklists": [], "labels": [], "actions": []}
+            board["labels"] = [{"id": new_id(), "idBoard": board["id"], "name": f"Label {i}", "color": TRELLO_COLORS[i % len(TRELLO_COLORS)]}
+                               for i in range(labels)]
+
+            for l in range(lists):
+                lst = {"id": new_id(), "name": f"List {l}", "idBoard": board["id"], "pos": (l + 1) * 16384, "closed": False}
+                board["lists"].append(lst)
+
+                for c in range(cards):
+                    card = {"id": new_id(), "name": f"Card {l}.{c}", "desc": f"Description of card {c} " * rng.randint(1, 20),
+                            "idBoard": board["id"], "idList": lst["id"], "pos": (c + 1) * 16384, "closed": False,
+                            "due": None, "dueComplete": False, "dateLastActivity": "2024-01-01T00:00:00.000Z",
+                            "attachments": [], "idAttachmentCover": None}
+                    card["labels"] = rng.sample(board["labels"], min(len(board["labels"]), rng.randint(0, 2)))
+                    card["idLabels"] = [label["id"] for label in card["labels"]]
+
+                    for a in range(attachments + link_attachments):
+                        is_upload = a < attachments
+                        attachment = {"id": new_id(), "name": f"file{a}.bin" if is_upload else f"https://example.com/{a}",
+                                      "fileName": f"file{a}.bin" if is_upload else None, "bytes": attachment_size if is_upload else None,
+                                      "mimeType": "application/octet-stream" if is_upload else None, "isUpload": is_upload,
+                                      "date": "2024-01-01T00:00:00.000Z"}
+                        card["attachments"].append(attachment)
+                        if is_upload:
+                            data["attachment_sizes"][attachment["id"]] = attachment_size
+                    if attachments:
+                        card["idAttachmentCover"] = card["attachments"][0]["id"]
+
+                    for k in range(checklists):
+                        board["checklists"].append({
+                            "id": new_id(), "name": f"Checklist {k}", "idCard": card["id"], "idBoard": board["id"], "pos": (k + 1) * 16384,
+                            "checkItems": [{"id": new_id(), "name": f"Task {i}", "pos": (i + 1) * 16384,
+                                            "state": rng.choice(["complete", "incomplete"])} for i in range(check_items)]
+                        })
+
+                    for m in range(comments):
+                        board["actions"].append({
+                            "id": new_id(), "type": "commentCard", "date": "2024-01-01T00:00:00.000Z",
+                            "data": {"text": f"Comment {m} on card {c}", "card": {"id": card["id"], "name": card["name"]}},
+                            "memberCreator": {"fullName": "Benchmark User", "username": "benchmark"}
+                        })
+                    board["cards"].append(card)
+
+            board["actions"].reverse() # Trello returns actions newest first
+            data["boards_by_org"][org["id"]].append(board)
+            data["boards"][board["id"]] = board
+
+    return data
\ No newline at end of file
@@ -0,0 +1,124 @@
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from config import BOARD_WORKERS, CARD_ITEM_WORKERS
+from utils import log_message
+from utils import log_event
+from utils import progress_summary
+from metrics import summary_lines
+from metrics import export_metrics
+from journal import journal
+from journal import JOURNAL_FILE
+from journal import fingerprint
+from trello_api import get_workspaces
+from trello_api import get_boards
+from trello_api import get_board_bundle
+from trello_api import get_board_actions
+from trello_api import build_board_index
+from planka_backend import create_project
+from planka_backend import create_board
+from planka_backend import create_list
+from planka_backend import update_list
+from planka_backend import update_comment
+from planka_backend import connect
+from planka_backend import flush
+from planka_backend import record
+from attachments import attachment_scheduler
+from migrators import POSITION_GAP
+from migrators import planka_positions
+from migrators import create_once
+from migrators import sync_once
+from migrators import list_fingerprint
+from migrators import sync_board_labels
+from migrators import migrate_card
+from migrators import wait_for_cards
+from migrators import migrate_board
+
+# Function: applies the edits of comments (updateComment actions) to the comments already imported into Planka
+def sync_comment_edits(edits):
+    for action in reversed(edits): # oldest first, so the latest edit wins
+        comment_id = action["data"]["action"]["id"]
+        planka_id = journal.lookup("comment", comment_id)
+        if not planka_id:
+            continue # the comment is new and has been created with its current text
+        started = time.monotonic()
+        update_comment(planka_id, action["data"]["action"]["text"], action["memberCreator"]["fullName"],
+                       action["memberCreator"]["username"], action["date"])
+        record("comment", comment_id, planka_id, fingerprint(action["data"]["action"]["text"]))
+        log_event("comment", comment_id, planka_id, time.monotonic() - started, "updated")
+
+# Function: reads the lists, cards, labels and checklists of a board and its actions of the given types (only those after since if
+# it is set) into the board index. Returns the actions, or None if the board has been deleted in Trello in the meantime
+def read_board(board, action_filter, since=None):
+    try:
+        actions = get_board_actions(board['id'], action_filter, since)
+        board['index'] = build_board_index(get_board_bundle(board['id']), [a for a in actions if a['type'] != "updateComment"])
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            log_message(f"A deleted board was missed: {board['name']} ({board['id']})", "WARNING")
+            return None
+        raise
+    return actions
+
+# Function: transfers the changes made to a board since its last migration or sync: new and renamed lists, new, edited and
+# moved cards, new labels, attachments, tasks and comments, edited tasks and comments. Untouched boards are not read at all
+def sync_board(board, board_planka, item_executor):
+    since = journal.last_activity(board['id'])
+    if not journal.is_done("board", board['id']): # a new board or a board whose migration was interrupted
+        log_message(f"The board {board['name']} has not been fully transferred yet, migrate it")
+        if read_board(board, "commentCard,copyCard") is not None:
+            migrate_board(board, board_planka, item_executor)
+        return
+    if since and board.get('dateLastActivity') and board['dateLastActivity'] <= since:
+        log_event("board", board['id'], board_planka['id'], 0, "unchanged")
+        return
+
+    actions = read_board(board, "commentCard,copyCard,updateComment", since)
+    if actions is None:
+        return
+    board_index = board['index']
+    card_futures = []
+    label_table = sync_board_labels(board, board_planka)
+
+    lists = board_index['lists']
+    for lst, list_position in zip(lists, planka_positions(lists)):
+        list_planka = sync_once("list", lst['id'], list_fingerprint(lst, list_position), create_list, update_list, board_planka['id'], lst['name'], list_position)
+
+        cards = board_index['cards_by_list'][lst['id']]
+        for card, position in zip(cards, planka_positions(cards)):
+            if since and card.get('dateLastActivity', "") <= since and not card['comments']:
+                continue # nothing has happened on the card since the last sync (moving a card updates its dateLastActivity)
+            # only attachments missing from the journal are uploaded, new tasks are created and changed tasks updated,
+            # and only the comments posted since the last sync are read
+            card_futures.append(item_executor.submit(migrate_card, card, board_planka['id'], list_planka['id'], position, label_table, item_executor))
+
+    wait_for_cards(card_futures)
+
+    sync_comment_edits([a for a in actions if a['type'] == "updateComment"])
+    flush()
+    journal.set_last_activity(board['id'], board.get('dateLastActivity'))
+    log_event("board", board['id'], board_planka['id'], 0, "updated")
+
+# Delta sync: transfers only what has changed in Trello since the previous migration or sync recorded in the journal
+def sync_workspaces(journal_path=JOURNAL_FILE):
+    connect()
+    journal.open(journal_path, resume=True) # the Trello -> Planka id map of the previous runs
+
+    with ThreadPoolExecutor(max_workers=BOARD_WORKERS) as board_executor, ThreadPoolExecutor(max_workers=CARD_ITEM_WORKERS) as item_executor, \
+         attachment_scheduler:
+        board_futures = []
+        for ws in reversed(get_workspaces()):
+            project = create_once("project", ws['id'], create_project, ws['displayName'])
+            for i, board in enumerate(get_boards(ws['id'])):
+                board_planka = create_once("board", board['id'], create_board, project['id'], board['name'], (i + 1) * POSITION_GAP)
+                board_futures.append(board_executor.submit(sync_board, board, board_planka, item_executor))
+
+        for future in board_futures:
+            future.result()
+        flush()
+
+    log_message("\nDelta sync complete!", console=True)
+    log_message(progress_summary(), console=True)
+    for line in summary_lines():
+        log_message(line, console=True)
+    export_metrics()
\ No newline at end of file
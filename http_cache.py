@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from config import HTTP_CACHE_MAX_MB, HTTP_CACHE_TTL
+from utils import BASE_DIR
+from utils import log_message
+
+# Default location of the cache of Trello responses
+HTTP_CACHE_FILE = os.path.join(BASE_DIR, "trello_cache.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    etag TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_used ON responses (used_at);
+"""
+
+# Function: returns how many seconds a response of a path stays fresh (the first matching pattern of HTTP_CACHE_TTL, otherwise 0:
+# the response is kept but revalidated before every use)
+def cache_ttl(path):
+    return next((seconds for pattern, seconds in HTTP_CACHE_TTL.items() if re.search(pattern, path)), 0)
+
+# Disk cache of the successful GET responses of a service, bounded in size (least recently used responses are evicted first).
+# A fresh response is served without a request; a stale one is revalidated with If-None-Match when the server sent an ETag.
+# In offline mode everything is served from the cache whatever its age, and a response missing from the cache is a 504
+class ResponseCache:
+    def __init__(self):
+        self.connection = None
+        self.offline = False
+        self.scope = ""
+        self.settings = None # the arguments of open, so that worker processes open the same cache
+        self.lock = threading.Lock()
+
+    # Function: opens (and creates if necessary) the cache file; scope keeps the responses of different accounts apart
+    def open(self, path=HTTP_CACHE_FILE, offline=False, scope=""):
+        self.settings = (path, offline, scope)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.offline = offline
+        self.scope = hashlib.sha1(scope.encode("utf-8")).hexdigest()
+        count, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        log_message(f"HTTP cache {path}: {count} responses, {size / 1024 / 1024:.1f} MB" + (", offline" if offline else ""))
+
+    # Function: returns the cache key of a request
+    def key(self, url, params=None):
+        return hashlib.sha1(json.dumps([self.scope, url, sorted((params or {}).items())], default=str).encode("utf-8")).hexdigest()
+
+    # Function: returns the cached entry of a key (etag, headers, body, stored_at), or None
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT etag, headers, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+        return {"etag": row[0], "headers": json.loads(row[1]), "body": row[2], "stored_at": row[3]} if row else None
+
+    # Function: checks whether a cached entry can be used without asking the server
+    def is_fresh(self, entry, path):
+        return self.offline or time.time() - entry["stored_at"] < cache_ttl(path)
+
+    # Function: stores a successful response, then evicts the least recently used responses above HTTP_CACHE_MAX_MB
+    def store(self, key, url, response):
+        body = response.content
+        headers = {name: value for name, value in response.headers.items() if name.lower() in ("content-type", "etag")}
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (key, url, response.headers.get("ETag"), json.dumps(headers), body, len(body), now, now))
+            excess = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - HTTP_CACHE_MAX_MB * 1024 * 1024
+            if excess > 0:
+                evicted = []
+                for old_key, size in self.connection.execute("SELECT key, size FROM responses WHERE key != ? ORDER BY used_at", (key,)):
+                    if excess <= 0:
+                        break
+                    evicted.append((old_key,))
+                    excess -= size
+                self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    # Function: marks a cached entry as fresh again after the server answered 304 Not Modified
+    def refresh(self, key):
+        with self.lock:
+            self.connection.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+
+    # Function: builds a response from a cached entry (or a 504 for a response that is missing in offline mode)
+    def response(self, url, entry=None):
+        response = requests.Response()
+        response.url = url
+        if entry is None:
+            response.status_code = 504
+            response.reason = "Not in the HTTP cache (offline)"
+            response._content = b""
+            return response
+        response.status_code = 200
+        response.reason = "OK (cached)"
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = entry["body"]
+        response.encoding = "utf-8"
+        return response
+
+trello_cache = ResponseCache()
\ No newline at end of file
@@ -0,0 +1,99 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import TRELLO_URL, PLANKA_URL, APIKEY, APITOKEN
+from config import USERNAME, PASSWORD
+from config import HTTP_POOL_SIZE, REQUEST_TIMEOUT, MAX_RETRIES
+from rate_limiter import trello_bucket
+from rate_limiter import planka_bucket
+from rate_limiter import send_request
+from http_cache import trello_cache
+from metrics import record_bytes
+from utils import log_message
+
+# Client of one service: a pooled keep-alive session, the rate limit bucket of the server and the shared retry policy
+class ServiceClient:
+    def __init__(self, base_url, bucket, pool_size=HTTP_POOL_SIZE):
+        self.base_url = base_url
+        self.bucket = bucket
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # Function: sends a request to a path of the service (or to a full URL) through the session
+    def request(self, method, path, **kwargs):
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return send_request(self.session, self.bucket, method, url, **kwargs)
+
+# Trello client: the API key and token are sent with every request by the session
+class TrelloClient(ServiceClient):
+    def __init__(self, base_url=TRELLO_URL, apikey=APIKEY, apitoken=APITOKEN):
+        super().__init__(base_url, trello_bucket)
+        self.session.params = {"key": apikey, "token": apitoken}
+        self.download_headers = {"Authorization": f'OAuth oauth_consumer_key="{apikey}", oauth_token="{apitoken}"'} # attachment downloads need OAuth
+
+    # Function: sends a request; with the HTTP cache open, GET requests go through it (streamed attachment downloads are not cached)
+    def request(self, method, path, **kwargs):
+        if method != "GET" or trello_cache.connection is None or (kwargs.get("stream") and not trello_cache.offline):
+            return super().request(method, path, **kwargs)
+
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        if kwargs.get("stream"):
+            return trello_cache.response(url) # offline: nothing is downloaded from Trello
+        key = trello_cache.key(url, kwargs.get("params"))
+        entry = trello_cache.get(key)
+        if entry and trello_cache.is_fresh(entry, path):
+            record_bytes("trello_cache", len(entry["body"]))
+            return trello_cache.response(url, entry)
+        if trello_cache.offline:
+            log_message(f"Trello response missing from the HTTP cache: GET {url}", "WARNING")
+            return trello_cache.response(url)
+
+        if entry and entry["etag"]:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": entry["etag"]}
+        response = super().request(method, path, **kwargs)
+        if response.status_code == 304 and entry:
+            trello_cache.refresh(key)
+            record_bytes("trello_cache", len(entry["body"]))
+            return trello_cache.response(url, entry)
+        if response.status_code == 200:
+            trello_cache.store(key, url, response)
+        return response
+
+# Planka client: owns the bearer token, gets it on the first request and again whenever the server answers 401
+class PlankaClient(ServiceClient):
+    def __init__(self, base_url=PLANKA_URL):
+        super().__init__(base_url, planka_bucket)
+        self.token = None
+        self.token_lock = threading.Lock()
+
+    # Function: authorises in Planka and returns the bearer token (only once if several threads get 401 for the same token)
+    def login(self, expired_token=None):
+        with self.token_lock:
+            if self.token is None or self.token == expired_token:
+                payload = {"emailOrUsername": USERNAME, "password": PASSWORD}
+                response = super().request("POST", "/access-tokens", json=payload) # paced and retried like any other request
+                response.raise_for_status()
+                self.token = response.json()["item"]
+                log_message("Received bearer token Planka, successful authorisation on the server")
+            return self.token
+
+    # Function: sends a request with the bearer token current when it is issued. The token goes in the headers of this request,
+    # not of the shared session, so on 401 exactly the token that was sent is renewed, even if other threads renewed it meanwhile
+    def request(self, method, path, **kwargs):
+        token = self.token or self.login()
+        for attempt in range(MAX_RETRIES + 1):
+            headers = {**kwargs.get("headers", {}), "Authorization": f"Bearer {token}"}
+            response = super().request(method, path, **{**kwargs, "headers": headers})
+            if response.status_code != 401:
+                return response
+            log_message("The Planka bearer token has expired, authorising again", "WARNING")
+            token = self.login(expired_token=token)
+            if kwargs.get("max_retries") == 0: # a streamed body cannot be sent again, its caller falls back to a file
+                return response
+        return response
+
+trello_client = TrelloClient()
+planka_client = PlankaClient()
\ No newline at end of file
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from utils import BASE_DIR
+from utils import log_message
+
+# Default location of the journal of created objects
+JOURNAL_FILE = os.path.join(BASE_DIR, "migration_journal.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mappings (
+    object_type TEXT NOT NULL,
+    trello_id TEXT NOT NULL,
+    planka_id TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    fingerprint TEXT,
+    PRIMARY KEY (object_type, trello_id)
+);
+CREATE TABLE IF NOT EXISTS synced_boards (
+    trello_id TEXT PRIMARY KEY,
+    last_activity TEXT
+);
+"""
+
+# Function: returns a short hash of the synchronised fields of an object, stored with its mapping to detect changes
+def fingerprint(*values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Durable journal of Trello id -> Planka id mappings. Every mapping is committed as soon as the Planka object is created,
+# so a run that stopped halfway can be resumed without creating duplicates
+class Journal:
+    def __init__(self):
+        self.connection = None
+        self.lock = threading.Lock()
+
+    # Function: opens the journal file; without resume the mappings of a previous run are discarded
+    def open(self, path=JOURNAL_FILE, resume=False):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60) # worker processes share the file
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(mappings)")]
+        if "fingerprint" not in columns: # journal written before the delta sync
+            self.connection.execute("ALTER TABLE mappings ADD COLUMN fingerprint TEXT")
+        if resume:
+            count = self.connection.execute("SELECT COUNT(*) FROM mappings").fetchone()[0]
+            log_message(f"Resuming the migration, {count} objects are already in the journal {path}")
+        else:
+            self.connection.execute("DELETE FROM mappings")
+            self.connection.execute("DELETE FROM synced_boards")
+
+    # Function: returns the Planka id of a Trello object, or None if it has not been created yet
+    def lookup(self, object_type, trello_id):
+        with self.lock:
+            row = self.connection.execute("SELECT planka_id FROM mappings WHERE object_type = ? AND trello_id = ?",
+                                          (object_type, trello_id)).fetchone()
+        return row[0] if row else None
+
+    # Function: records that a Trello object has been created in Planka (with the fingerprint of its fields, if given)
+    def record(self, object_type, trello_id, planka_id, fingerprint=None):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO mappings (object_type, trello_id, planka_id, done, fingerprint) "
+                                    "VALUES (?, ?, ?, COALESCE((SELECT done FROM mappings WHERE object_type = ? AND trello_id = ?), 0), ?)",
+                                    (object_type, trello_id, planka_id, object_type, trello_id, fingerprint))
+
+    # Function: returns the fingerprint recorded for a Trello object, or None
+    def get_fingerprint(self, object_type, trello_id):
+        with self.lock:
+            row = self.connection.execute("SELECT fingerprint FROM mappings WHERE object_type = ? AND trello_id = ?",
+                                          (object_type, trello_id)).fetchone()
+        return row[0] if row else None
+
+    # Function: records that an object and everything inside it has been transferred
+    def mark_done(self, object_type, trello_id):
+        with self.lock:
+            self.connection.execute("UPDATE mappings SET done = 1 WHERE object_type = ? AND trello_id = ?", (object_type, trello_id))
+
+    # Function: checks whether an object and everything inside it has been transferred
+    def is_done(self, object_type, trello_id):
+        with self.lock:
+            row = self.connection.execute("SELECT done FROM mappings WHERE object_type = ? AND trello_id = ?",
+                                          (object_type, trello_id)).fetchone()
+        return bool(row and row[0])
+
+    # Function: removes the mapping of an object that is missing in Planka, so the next --resume run creates it again
+    def forget(self, object_type, trello_id):
+        with self.lock:
+            self.connection.execute("DELETE FROM mappings WHERE object_type = ? AND trello_id = ?", (object_type, trello_id))
+
+    # Function: clears the fingerprint of an object that differs in Planka, so the next run updates it
+    def clear_fingerprint(self, object_type, trello_id):
+        with self.lock:
+            self.connection.execute("UPDATE mappings SET fingerprint = NULL WHERE object_type = ? AND trello_id = ?", (object_type, trello_id))
+
+    # Function: records that an object has to be transferred again (the next --resume run goes through it)
+    def mark_undone(self, object_type, trello_id):
+        with self.lock:
+            self.connection.execute("UPDATE mappings SET done = 0 WHERE object_type = ? AND trello_id = ?", (object_type, trello_id))
+
+    # Function: returns the dateLastActivity of a Trello board at its last migration or sync, or None
+    def last_activity(self, board_id):
+        with self.lock:
+            row = self.connection.execute("SELECT last_activity FROM synced_boards WHERE trello_id = ?", (board_id,)).fetchone()
+        return row[0] if row else None
+
+    # Function: records the dateLastActivity of a Trello board whose changes up to then have been transferred
+    def set_last_activity(self, board_id, last_activity):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO synced_boards (trello_id, last_activity) VALUES (?, ?)", (board_id, last_activity))
+
+journal = Journal()
\ No newline at end of file
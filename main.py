@@ -1,4 +1,92 @@
+import argparse
+from config import MIGRATION_PROCESSES
 from migrators import migrate_workspaces
+from migrators import SHARD_MAP_FILE
+from delta_sync import sync_workspaces
+from planner import plan_migration
+from planner import plan_lines
+from verify import verify_workspaces
+from snapshot import crawl_trello
+from snapshot import filter_snapshot
+from snapshot import shard_snapshot
+from snapshot_store import SNAPSHOT_FILE
+from snapshot_store import save_snapshot
+from snapshot_store import load_snapshot
+from snapshot_store import import_trello_export
+from utils import log_message
+from http_client import trello_client
+from http_cache import trello_cache
+from http_cache import HTTP_CACHE_FILE
+
+# Function: parses the --shard value "I/N" into (I, N)
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("the shard must look like I/N, e.g. 0/3")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError("the shard index must be between 0 and N-1")
+    return index, count
+
+# Function: reads the command line options of the migration
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migration of workspaces, boards, lists and cards from Trello to Planka")
+    parser.add_argument("--crawl-only", action="store_true", help="read Trello into the snapshot file and exit without migrating")
+    parser.add_argument("--snapshot", metavar="FILE", help="migrate from a saved SQLite snapshot instead of the live Trello API")
+    parser.add_argument("--from-export", metavar="JSON", nargs="+", help="migrate from Trello board JSON exports")
+    parser.add_argument("--plan", action="store_true", help="print the Planka requests, attachment bytes and projected duration of the migration without migrating")
+    parser.add_argument("--delta", action="store_true", help="transfer only the changes made in Trello since the previous migration or delta sync")
+    parser.add_argument("--verify", action="store_true", help="compare the migrated boards with Trello and prepare a --resume run that transfers only the missing or different objects")
+    parser.add_argument("--resume", action="store_true", help="continue a stopped migration, skipping objects recorded in the journal")
+    parser.add_argument("--processes", type=int, help=f"worker processes that migrate boards in parallel (default: {MIGRATION_PROCESSES})")
+    parser.add_argument("--stream", action="store_true", help="read the boards page by page while migrating them, with flat memory use (live Trello API only)")
+    parser.add_argument("--shard", metavar="I/N", type=parse_shard, help="migrate only shard I of N (boards are split by id), for running the migration from several hosts")
+    parser.add_argument("--shard-map", metavar="FILE", default=SHARD_MAP_FILE, help=f"workspace -> project map written by shard 0 and read by the other shards, on storage shared by the hosts (default: {SHARD_MAP_FILE})")
+    parser.add_argument("--include-workspace", metavar="NAME", nargs="+", help="migrate only these workspaces (names or ids)")
+    parser.add_argument("--exclude-workspace", metavar="NAME", nargs="+", help="do not migrate these workspaces (names or ids)")
+    parser.add_argument("--include-board", metavar="NAME", nargs="+", help="migrate only these boards (names or ids)")
+    parser.add_argument("--exclude-board", metavar="NAME", nargs="+", help="do not migrate these boards (names or ids)")
+    parser.add_argument("--http-cache", metavar="FILE", nargs="?", const=HTTP_CACHE_FILE, help=f"keep Trello GET responses in a disk cache (default: {HTTP_CACHE_FILE})")
+    parser.add_argument("--offline", action="store_true", help="serve Trello requests only from the HTTP cache, never from Trello")
+    parser.add_argument("--save-snapshot", metavar="FILE", help=f"save the Trello data to a SQLite snapshot (default for --crawl-only: {SNAPSHOT_FILE})")
+    args = parser.parse_args()
+    if args.stream and (args.snapshot or args.from_export or args.plan or args.crawl_only or args.save_snapshot or args.delta):
+        parser.error("--stream reads Trello during the migration and cannot be combined with snapshots, exports, --plan or --delta")
+    if args.delta and (args.snapshot or args.from_export or args.plan or args.crawl_only or args.save_snapshot or args.shard or args.processes
+                       or args.include_workspace or args.exclude_workspace or args.include_board or args.exclude_board):
+        parser.error("--delta reads the changed boards of all workspaces from Trello and cannot be combined with snapshots, exports, "
+                     "--plan, --crawl-only, --save-snapshot, --processes, --shard or the workspace and board filters")
+    if args.verify and (args.stream or args.plan or args.delta or args.crawl_only):
+        parser.error("--verify compares a snapshot with Planka and cannot be combined with --stream, --plan, --delta or --crawl-only")
+    args.processes = args.processes or MIGRATION_PROCESSES
+    return args
 
 if __name__ == "__main__":
-    migrate_workspaces()
\ No newline at end of file
+    args = parse_args()
+    if args.http_cache or args.offline:
+        trello_cache.open(args.http_cache or HTTP_CACHE_FILE, offline=args.offline, scope=trello_client.session.params["token"])
+
+    if args.delta:
+        sync_workspaces() # reads only the boards that changed since the previous run, no snapshot is taken
+    else:
+        if args.snapshot:
+            snapshot = load_snapshot(args.snapshot)
+        elif args.from_export:
+            snapshot = import_trello_export(args.from_export)
+        else:
+            snapshot = crawl_trello(with_index=not args.stream)
+
+        if args.save_snapshot or args.crawl_only:
+            save_snapshot(snapshot, args.save_snapshot or SNAPSHOT_FILE)
+
+        snapshot = filter_snapshot(snapshot, args.include_workspace, args.exclude_workspace, args.include_board, args.exclude_board)
+        if args.shard:
+            snapshot = shard_snapshot(snapshot, *args.shard)
+
+        if args.plan:
+            for line in plan_lines(plan_migration(snapshot, crawl=not (args.snapshot or args.from_export), processes=args.processes)):
+                log_message(line, console=True)
+        elif args.verify:
+            verify_workspaces(snapshot)
+        elif not args.crawl_only:
+            migrate_workspaces(snapshot, resume=args.resume, processes=args.processes, shard=args.shard, shard_map=args.shard_map)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import threading
+import time
+from config import METRICS_JSON_FILE, METRICS_PROMETHEUS_FILE
+
+# Latency buckets of the histograms (seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ID_SEGMENT = re.compile(r"^([0-9a-f]{24}|\d{3,})$")
+
+metrics_lock = threading.Lock()
+requests_by_endpoint = {} # (service, method, endpoint) -> {"statuses", "count", "total_time", "buckets"}
+retries_by_endpoint = {} # (service, method, endpoint, reason) -> count
+transferred_bytes = {} # direction -> bytes
+started = time.monotonic()
+
+# Function: turns a request URL into an endpoint name, replacing ids and file names with placeholders
+def endpoint_name(url):
+    path = url.split("?", 1)[0].split("://", 1)[-1].split("/", 1)[-1]
+    segments = path.split("/")
+    if "download" in segments:
+        segments = segments[:segments.index("download") + 1] + ["{name}"]
+    return "/" + "/".join("{id}" if ID_SEGMENT.match(segment) else segment for segment in segments)
+
+# Function: records one HTTP request (called by rate_limiter.send_request for every attempt)
+def record_request(service, method, url, status, duration):
+    key = (service, method, endpoint_name(url))
+    with metrics_lock:
+        stats = requests_by_endpoint.setdefault(key, {"statuses": {}, "count": 0, "total_time": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)})
+        stats["count"] += 1
+        stats["total_time"] += duration
+        stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+        stats["buckets"][next((i for i, bound in enumerate(LATENCY_BUCKETS) if duration <= bound), len(LATENCY_BUCKETS))] += 1
+
+# Function: records a retried request and the reason of the retry (status code or connection error)
+def record_retry(service, method, url, reason):
+    key = (service, method, endpoint_name(url), reason)
+    with metrics_lock:
+        retries_by_endpoint[key] = retries_by_endpoint.get(key, 0) + 1
+
+# Function: adds transferred bytes (e.g. "attachment_download", "attachment_upload")
+def record_bytes(direction, count):
+    with metrics_lock:
+        transferred_bytes[direction] = transferred_bytes.get(direction, 0) + count
+
+# Function: passes chunks through while counting their bytes
+def count_bytes(chunks, direction):
+    for chunk in chunks:
+        record_bytes(direction, len(chunk))
+        yield chunk
+
+# Function: estimates a latency percentile from the histogram buckets (upper bound of the bucket)
+def percentile(stats, fraction):
+    target = stats["count"] * fraction
+    seen = 0
+    for i, count in enumerate(stats["buckets"]):
+        seen += count
+        if seen >= target:
+            return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+    return float("inf")
+
+# Function: returns the live dashboard line: requests per second per service and attachment throughput
+def dashboard_line():
+    elapsed = max(time.monotonic() - started, 1e-9)
+    with metrics_lock:
+        per_service = {}
+        for (service, _, _), stats in requests_by_endpoint.items():
+            per_service[service] = per_service.get(service, 0) + stats["count"]
+        retries = sum(retries_by_endpoint.values())
+        attachment_bytes = transferred_bytes.get("attachment_upload", 0)
+    rates = ", ".join(f"{service} {count / elapsed:.1f} req/sec" for service, count in sorted(per_service.items())) or "no requests"
+    return f"{rates}, {retries} retries, attachments {attachment_bytes / elapsed / 1024 / 1024:.2f} MB/sec"
+
+# Function: returns the summary report lines (one per endpoint, then retries and bytes)
+def summary_lines():
+    lines = ["Requests by endpoint (count, statuses, mean / p50 / p95 latency):"]
+    with metrics_lock:
+        for (service, method, endpoint), stats in sorted(requests_by_endpoint.items(), key=lambda item: -item[1]["total_time"]):
+            statuses = ", ".join(f"{status}: {count}" for status, count in sorted(stats["statuses"].items()))
+            lines.append(f"  {service} {method} {endpoint}: {stats['count']} ({statuses}), "
+                         f"{stats['total_time'] / stats['count']:.3f} / {percentile(stats, 0.5)} / {percentile(stats, 0.95)} sec")
+        for (service, method, endpoint, reason), count in sorted(retries_by_endpoint.items()):
+            lines.append(f"  Retries {service} {method} {endpoint} ({reason}): {count}")
+        for direction, count in sorted(transferred_bytes.items()):
+            lines.append(f"  Bytes {direction}: {count}")
+    return lines
+
+# Function: returns all metrics as a dictionary (for the JSON export)
+def metrics_snapshot():
+    with metrics_lock:
+        return {
+            "elapsed": time.monotonic() - started,
+            "latency_buckets": list(LATENCY_BUCKETS),
+            "requests": [{"service": service, "method": method, "endpoint": endpoint, **stats}
+                         for (service, method, endpoint), stats in requests_by_endpoint.items()],
+            "retries": [{"service": service, "method": method, "endpoint": endpoint, "reason": reason, "count": count}
+                        for (service, method, endpoint, reason), count in retries_by_endpoint.items()],
+            "bytes": dict(transferred_bytes)
+        }
+
+# Function: returns the metrics gathered since the last call and resets them (a worker process hands them to the coordinator)
+def take_metrics():
+    with metrics_lock:
+        taken = {"requests": dict(requests_by_endpoint), "retries": dict(retries_by_endpoint), "bytes": dict(transferred_bytes)}
+        requests_by_endpoint.clear()
+        retries_by_endpoint.clear()
+        transferred_bytes.clear()
+    return taken
+
+# Function: adds the metrics taken in a worker process to the metrics of this process
+def merge_metrics(taken):
+    with metrics_lock:
+        for key, stats in taken["requests"].items():
+            total = requests_by_endpoint.setdefault(key, {"statuses": {}, "count": 0, "total_time": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)})
+            total["count"] += stats["count"]
+            total["total_time"] += stats["total_time"]
+            for status, count in stats["statuses"].items():
+                total["statuses"][status] = total["statuses"].get(status, 0) + count
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], stats["buckets"])]
+        for key, count in taken["retries"].items():
+            retries_by_endpoint[key] = retries_by_endpoint.get(key, 0) + count
+        for direction, count in taken["bytes"].items():
+            transferred_bytes[direction] = transferred_bytes.get(direction, 0) + count
+
+# Function: formats the metrics in the Prometheus text exposition format (for the node_exporter textfile collector); every metric
+# family is one block: its TYPE line, then all its samples
+def prometheus_text():
+    with metrics_lock:
+        lines = ["# TYPE migration_requests_total counter"]
+        for (service, method, endpoint), stats in requests_by_endpoint.items():
+            for status, count in stats["statuses"].items():
+                lines.append(f'migration_requests_total{{service="{service}",method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+        lines.append("# TYPE migration_request_duration_seconds histogram")
+        for (service, method, endpoint), stats in requests_by_endpoint.items():
+            labels = f'service="{service}",method="{method}",endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], stats["buckets"]):
+                cumulative += count
+                lines.append(f'migration_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"migration_request_duration_seconds_sum{{{labels}}} {stats['total_time']}")
+            lines.append(f"migration_request_duration_seconds_count{{{labels}}} {stats['count']}")
+        lines.append("# TYPE migration_retries_total counter")
+        for (service, method, endpoint, reason), count in retries_by_endpoint.items():
+            lines.append(f'migration_retries_total{{service="{service}",method="{method}",endpoint="{endpoint}",reason="{reason}"}} {count}')
+        lines.append("# TYPE migration_bytes_total counter")
+        for direction, count in transferred_bytes.items():
+            lines.append(f'migration_bytes_total{{direction="{direction}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+# Function: writes the JSON and Prometheus exports (through a temporary file, so readers never see a half-written file)
+def export_metrics():
+    for path, text in ((METRICS_JSON_FILE, lambda: json.dumps(metrics_snapshot(), indent=2)), (METRICS_PROMETHEUS_FILE, prometheus_text)):
+        if path:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text())
+            os.replace(path + ".tmp", path)
\ No newline at end of file
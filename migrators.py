@@ -1,226 +1,504 @@
-import urllib.parse
-import requests
+import json
 import os
+import threading
 import time
-from config import APIKEY, APITOKEN
+import requests
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from config import BOARD_WORKERS, CARD_ITEM_WORKERS
+from config import STREAM_WINDOW
 from utils import log_message
-from utils import get_token
+from utils import log_event
+from utils import progress
+from utils import progress_summary
+from utils import set_progress_total
+from utils import take_progress
+from utils import merge_progress
+from utils import start_worker_log
+from utils import BASE_DIR
+from metrics import summary_lines
+from metrics import export_metrics
+from metrics import take_metrics
+from metrics import merge_metrics
+from http_client import trello_client
+from http_client import planka_client
+from rate_limiter import trello_bucket
+from rate_limiter import planka_bucket
+from http_cache import trello_cache
 from utils import count_trello_items
 from labels_planka import get_planka_label_color
-from planka_api import transliterate_filename
-from planka_api import add_attachment
-from planka_api import update_card_cover
-from planka_api import add_label_to_card
-from planka_api import create_label
-from planka_api import create_project
-from planka_api import create_board
-from planka_api import create_card
-from planka_api import create_list
-from planka_api import create_task
-from planka_api import add_comment
-from trello_api import get_workspaces
-from trello_api import get_boards
-from trello_api import get_lists
-from trello_api import get_cards
-from trello_api import get_card_checklists
-from trello_api import get_card_comments
-from trello_api import get_card_cover_attachment_id
-from trello_api import get_card_attachments
-from planka_api import convert_to_trello_timezone
-
-# Function transfers attachments from Trello to Planka, preserving the upload date and cover (optionally with the original creation date added)
-ADD_DATE_TO_FILENAME = True  # Flag: True - add date to file name, False - leave original name
-def migrate_attachments(token, card_id_planka, card_id_trello):
-    attachments = get_card_attachments(card_id_trello, APIKEY, APITOKEN)
-    cover_attachment_id = get_card_cover_attachment_id(card_id_trello)
-
-    if not attachments:
-        log_message(f"There are no attachments for the card, nothing has been uploaded")
-        return
+from planka_backend import add_label_to_card
+from planka_backend import create_label
+from planka_backend import get_board_labels
+from planka_backend import create_project
+from planka_backend import create_board
+from planka_backend import create_card
+from planka_backend import create_list
+from planka_backend import update_list
+from planka_backend import update_card
+from planka_backend import create_task
+from planka_backend import update_task
+from planka_backend import add_comment
+from planka_backend import update_comment
+from planka_backend import connect
+from planka_backend import flush
+from planka_backend import record
+from snapshot import crawl_trello
+from trello_api import get_board_skeleton
+from trello_api import iter_card_bundles
+from trello_api import CommentSpool
+from journal import journal
+from journal import fingerprint
+from journal import JOURNAL_FILE
+from attachments import attachment_scheduler
 
-    planka_attachments = {}
-    
-    for attachment in attachments:
-        attachment_id = attachment["id"]
-
-        raw_file_name = attachment.get("name") or urllib.parse.unquote(attachment.get("fileName", "attachment"))
-        MAX_FILENAME_LENGTH = 200
-        if len(raw_file_name) > MAX_FILENAME_LENGTH:
-            raw_file_name = raw_file_name[:MAX_FILENAME_LENGTH] + "..."
-        file_name_translit = transliterate_filename(raw_file_name)
-        created_at = attachment.get("date", None)
-
-        # Add the date to the file name if the flag is enabled
-        if ADD_DATE_TO_FILENAME and created_at:
-            try:
-                date_str = f"(created_at_{convert_to_trello_timezone(created_at, 'Europe/Moscow')})" # Select the timezone you're in
-                base, ext = os.path.splitext(file_name_translit)
-                file_name_translit = f"{base}_{date_str}{ext}"
-            except ValueError:
-                log_message(f"Date processing error {created_at} for file {file_name_translit}, leave original name")
-
-        file_path = f"/tmp/{file_name_translit}"
-
-        if len(file_path) > 255:
-            log_message(f"Error: File ‘{raw_file_name}’ has exceeded the path length limit after processing and will be skipped")
-            continue
+# Function: returns the Planka object of a Trello object, calling create(*args) only if the journal has no mapping for it.
+# The outcome (created, skipped, failed or error) and the duration are logged as an event
+def create_once(object_type, trello_id, create, *args, fingerprint=None):
+    planka_id = journal.lookup(object_type, trello_id)
+    if planka_id:
+        log_event(object_type, trello_id, planka_id, 0, "skipped")
+        return {"id": planka_id}
 
-        download_url = f"https://api.trello.com/1/cards/{card_id_trello}/attachments/{attachment_id}/download/{urllib.parse.quote(raw_file_name)}"
-        headers = {"Authorization": f'OAuth oauth_consumer_key="{APIKEY}", oauth_token="{APITOKEN}"'}
-
-        try:
-            with requests.get(download_url, headers=headers, stream=True) as r:
-                r.raise_for_status()
-                with open(file_path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-        except requests.exceptions.RequestException as e:
-            log_message(f"Loading error in Planka {raw_file_name}: {e}")
-            continue
+    started = time.monotonic()
+    try:
+        item = create(*args)
+    except Exception:
+        log_event(object_type, trello_id, None, time.monotonic() - started, "error")
+        raise
+
+    if not item:
+        log_event(object_type, trello_id, None, time.monotonic() - started, "failed")
+        return None
+    record(object_type, trello_id, item["id"], fingerprint)
+    log_event(object_type, trello_id, item["id"], time.monotonic() - started, "created")
+    return item
+
+# Function: like create_once, but an object that is already in Planka is updated with update(planka_id, *args) when its
+# fingerprint differs from the one recorded in the journal (used by the delta sync; in a fresh migration everything is created)
+def sync_once(object_type, trello_id, fingerprint, create, update, parent_id, *args):
+    planka_id = journal.lookup(object_type, trello_id)
+    if not planka_id:
+        return create_once(object_type, trello_id, create, parent_id, *args, fingerprint=fingerprint)
+    if journal.get_fingerprint(object_type, trello_id) == fingerprint:
+        log_event(object_type, trello_id, planka_id, 0, "unchanged")
+        return {"id": planka_id}
+
+    started = time.monotonic()
+    try:
+        update(planka_id, *args)
+    except Exception:
+        log_event(object_type, trello_id, planka_id, time.monotonic() - started, "error")
+        raise
+    record(object_type, trello_id, planka_id, fingerprint)
+    log_event(object_type, trello_id, planka_id, time.monotonic() - started, "updated")
+    return {"id": planka_id}
+
+# Function: fingerprint of the list fields kept up to date by the delta sync (the name and the position)
+def list_fingerprint(lst, position):
+    return fingerprint(lst["name"], position)
+
+# Function: fingerprint of the card fields kept up to date by the delta sync (including the list and position, so a move is a change)
+def card_fingerprint(card, position):
+    return fingerprint(card["name"], card.get("desc") or "", card.get("due"), card.get("dueComplete", False), card["idList"], position)
 
-        try:
-            planka_attachment = add_attachment(token, card_id_planka, file_path, created_at)
-            planka_attachments[attachment_id] = planka_attachment["id"]
-            log_message(f"The attachment {file_name_translit} has been uploaded to the card")
-        except requests.exceptions.RequestException as e:
-            log_message(f"Loading error in Planka {file_name_translit}: {e}")
+# Function: fingerprint of the task fields kept up to date by the delta sync
+def task_fingerprint(item, position):
+    return fingerprint(item["name"], item["state"], position)
+
+# Function: fingerprint of the comment fields kept up to date (the text)
+def comment_fingerprint(comment):
+    return fingerprint(comment['data']['text'])
+
+# Planka sorts boards, lists, cards, tasks and labels by position; spaced positions leave room for inserts without renumbering
+POSITION_GAP = 65536
+
+# Function: returns the Planka positions of items given in their Trello order: Trello's own pos values if every item has one
+# (they are already spaced and stay stable when items are added later), otherwise spaced indexes
+def planka_positions(items):
+    if all(isinstance(item.get("pos"), (int, float)) and item["pos"] > 0 for item in items):
+        return [item["pos"] for item in items]
+    return [(i + 1) * POSITION_GAP for i in range(len(items))]
+
+# Function: synchronises the labels of a board once before its cards are transferred. Labels that already exist on the Planka
+# board (or in the journal) are reused, only the missing ones are created. Returns the table Trello label id -> Planka label id
+def sync_board_labels(board, board_planka):
+    label_table = {}
+    existing = {(label.get("name") or "", label["color"]): label["id"] for label in get_board_labels(board_planka['id'])}
+    missing = []
+
+    for i, label in enumerate(board['index']['labels']):
+        label_name = (label.get("name") or "").strip()
+        planka_color = get_planka_label_color(label.get("color"))
+        label_id = journal.lookup("label", label["id"]) or existing.get((label_name, planka_color))
+        if label_id:
+            label_table[label["id"]] = label_id
+            journal.record("label", label["id"], label_id)
+        else:
+            missing.append((label, label_name, planka_color, (i + 1) * POSITION_GAP))
+
+    created = 0
+    for label, label_name, planka_color, position in missing:
+        label_id = existing.get((label_name, planka_color))
+        if label_id: # a Trello label with the same name and colour has just been created on this board
+            label_table[label["id"]] = label_id
+            record("label", label["id"], label_id)
+            continue
+        new_label = create_once("label", label["id"], create_label, board_planka['id'], label_name, planka_color, position)
+        if not new_label:
+            log_message(f"Label creation error: {label_name} ({planka_color})", "ERROR")
             continue
+        label_table[label["id"]] = new_label["id"]
+        existing[(label_name, planka_color)] = new_label["id"]
+        created += 1
+
+    log_message(f"Labels of the board {board['name']}: {len(label_table) - created} already in Planka, {created} created")
+    return label_table
+
+# Function: binds one label to a card in Planka (bindings of a card are issued concurrently)
+def bind_card_label(card_id_planka, card_id_trello, label_id):
+    if not create_once("card_label", f"{card_id_trello}_{label_id}", add_label_to_card, card_id_planka, label_id):
+        log_message(f"Failed to bind label {label_id} to a card", "ERROR")
+
+# Function: transfers the tasks (checklist items) of a card; the items of all its checklists become one list of tasks with spaced positions
+def migrate_card_tasks(card_id_planka, card_trello):
+    items = [item for checklist in card_trello['checklists'] for item in checklist["checkItems"]]
+    for i, item in enumerate(items):
+        is_completed = item["state"] == "complete"
+        position = (i + 1) * POSITION_GAP
+        sync_once("task", item["id"], task_fingerprint(item, position), create_task, update_task, card_id_planka, item["name"], is_completed, position)
 
-        os.remove(file_path)
+# Function: transfers the comments of a card, oldest first and one at a time, because Planka orders comments by creation time
+def migrate_card_comments(card_id_planka, card_trello):
+    for comment in reversed(card_trello['comments']):
+        log_message(f"Adding a comment to a card: {comment['data']['text'][:30]}...", "DEBUG")
+        sync_once(
+            "comment",
+            comment['id'],
+            comment_fingerprint(comment),
+            add_comment,
+            update_comment, # a comment found different by --verify is written again
+            card_id_planka,
+            comment['data']['text'],
+            comment['memberCreator']['fullName'],
+            comment['memberCreator']['username'],
+            comment['date']
+        )
 
-    # Search for a cover by file name if the cover ID is known
-    cover_planka_id = planka_attachments.get(cover_attachment_id)
-    update_card_cover(token, card_id_planka, cover_planka_id)
+# Function: counts the lists, cards, attachments and comments of a board transferred by a previous run for the migration report
+# (its uploaded attachments separately: link attachments are never transferred)
+def count_board_items(board):
+    if 'index' not in board:
+        return {"lists": 0, "cards": 0, "attachments": 0, "comments": 0} # a streamed board is only counted while it is transferred
+    board_index = board['index']
+    attachments = [attachment for card in board_index['cards'].values() for attachment in card['attachments']]
+    return {
+        "lists": len(board_index['lists']),
+        "cards": len(board_index['cards']),
+        "attachments": len(attachments),
+        "uploaded": sum(1 for attachment in attachments if attachment.get("isUpload", True)),
+        "comments": sum(len(card['comments']) for card in board_index['cards'].values())
+    }
 
-# Function to transfer labels from Trello to Planka, preserving order
-label_cache = {}  # Global dictionary to cache created labels (to avoid duplicate labels)
-def migrate_card_labels(token, board_id, card_id_planka, card_trello):
-    global label_cache
+# Function: creates (or, in a delta sync, updates and moves) one card at its position, then submits the transfer of its contents
+# (labels, attachments, tasks, comments) to the item executor and returns their futures
+def migrate_card(card, board_id_planka, list_id_planka, position, label_table, item_executor):
+    card_planka = sync_once(
+        "card",
+        card['id'],
+        card_fingerprint(card, position),
+        create_card,
+        lambda card_id, *fields: update_card(card_id, board_id_planka, list_id_planka, *fields), # a changed list or position moves the card
+        list_id_planka,
+        card['name'],
+        card.get('desc', ''),
+        card.get('due'),
+        card.get('dueComplete', False),
+        position
+    )
+    futures = [
+        item_executor.submit(bind_card_label, card_planka['id'], card['id'], label_id) # label migration
+        for label_id in dict.fromkeys(label_table[label['id']] for label in card.get('labels', []) if label['id'] in label_table)
+    ] # Trello labels of the same name and colour share one Planka label, which is bound once
+    return futures + [
+        attachment_scheduler.submit_card(card_planka['id'], card), # attachment migration, on the lanes of the attachment scheduler
+        item_executor.submit(migrate_card_tasks, card_planka['id'], card), # migration of checklists (tasks)
+        item_executor.submit(migrate_card_comments, card_planka['id'], card) # comment migration
+    ]
 
-    labels = card_trello.get("labels", [])
-    if not labels:
-        log_message("There are no labels on the card")
+# Function: waits for the cards submitted by migrate_card and then for their contents (re-raises the first error)
+def wait_for_cards(card_futures):
+    for future in card_futures:
+        for item_future in future.result():
+            item_future.result()
+
+# Function: transfers the lists and cards of one board. Every object is sent with its position, so the cards of a board and their
+# contents (attachments, labels, tasks, comments) are all transferred concurrently
+def migrate_board(board, board_planka, item_executor):
+    counts = {"lists": 0, "cards": 0, "attachments": 0, "comments": 0}
+    board_index = board['index']
+    card_futures = []
+    label_table = sync_board_labels(board, board_planka) # labels are created once per board, cards only bind them
+
+    lists = board_index['lists'] # list migration
+    counts["lists"] += len(lists)
+    for lst, list_position in zip(lists, planka_positions(lists)):
+        log_message(f"list migration: {lst['name']}", "DEBUG")
+        list_planka = sync_once("list", lst['id'], list_fingerprint(lst, list_position), create_list, update_list, board_planka['id'], lst['name'], list_position)
+
+        cards = board_index['cards_by_list'][lst['id']]  # card migration
+        counts["cards"] += len(cards)
+        for card, position in zip(cards, planka_positions(cards)):
+            counts["attachments"] += len(card['attachments'])
+            counts["comments"] += len(card['comments'])
+            card_futures.append(item_executor.submit(migrate_card, card, board_planka['id'], list_planka['id'], position, label_table, item_executor))
+
+    wait_for_cards(card_futures)
+
+    flush() # the database backend writes the rest of the board before it is marked as done
+    journal.mark_done("board", board['id'])
+    journal.set_last_activity(board['id'], board.get('dateLastActivity')) # the delta sync starts from here
+    return counts
+
+# Function: releases the in-flight slot of a streamed card once the card and all its contents are transferred (errors are collected)
+def release_when_done(card_future, window, errors):
+    if card_future.exception():
+        errors.append(card_future.exception())
+        window.release()
         return
+    item_futures = card_future.result()
+    remaining = [len(item_futures)]
+    lock = threading.Lock()
 
-    log_message(f"Labels transfer:: {', '.join([l['color'] for l in labels])}")
+    def item_done(item_future):
+        if item_future.exception():
+            errors.append(item_future.exception())
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            window.release()
 
-    for label in reversed(labels):
-        trello_color = label.get("color", "gray")
-        label_name = label.get("name", "").strip()
-        planka_color = get_planka_label_color(trello_color)
+    for item_future in item_futures:
+        item_future.add_done_callback(item_done)
 
-        label_key = f"{board_id}_{label_name}_{planka_color}"
+# Function: transfers a board read page by page (--stream): lists and labels first, then the cards as Trello returns them, with
+# at most STREAM_WINDOW cards in flight, so memory stays flat whatever the size of the board. The comments of the board are
+# spooled to a temporary file; explicit positions keep the order of the cards although they arrive newest first
+def migrate_board_stream(board, board_planka, item_executor):
+    counts = {"lists": 0, "cards": 0, "attachments": 0, "comments": 0}
+    try:
+        skeleton = get_board_skeleton(board['id'])
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            log_message(f"A deleted board was missed: {board['name']} ({board['id']})", "WARNING")
+            return counts
+        raise
+    label_table = sync_board_labels({**board, "index": {"labels": skeleton.get("labels", [])}}, board_planka)
 
-        if label_key in label_cache:
-            label_id = label_cache[label_key]
-            log_message(f"The label ‘{label_name}’ ({planka_color}) is already in the cache, use the ID {label_id}")
-        else:
-            new_label = create_label(token, board_id, label_name, planka_color)
-            if not new_label:
-                log_message(f"Label creation error: {label_name} ({planka_color})")
-                continue
+    lists = skeleton['lists']
+    list_table = {}
+    counts["lists"] += len(lists)
+    for lst, list_position in zip(lists, planka_positions(lists)):
+        log_message(f"list migration: {lst['name']}", "DEBUG")
+        list_table[lst['id']] = sync_once("list", lst['id'], list_fingerprint(lst, list_position), create_list, update_list,
+                                          board_planka['id'], lst['name'], list_position)['id']
 
-            label_id = new_label["id"]
-            label_cache[label_key] = label_id
+    window = threading.BoundedSemaphore(STREAM_WINDOW)
+    errors = []
+    with CommentSpool(board['id']) as spool:
+        for card in iter_card_bundles(board['id'], list_table, spool):
+            if errors:
+                break # stop reading the board after the first error, it is raised below
+            counts["cards"] += 1
+            counts["attachments"] += len(card['attachments'])
+            counts["comments"] += len(card['comments'])
+            window.acquire()
+            card_future = item_executor.submit(migrate_card, card, board_planka['id'], list_table[card['idList']], card['pos'], label_table, item_executor)
+            card_future.add_done_callback(lambda future: release_when_done(future, window, errors))
+        for _ in range(STREAM_WINDOW):
+            window.acquire() # waits until the last cards are transferred
+    if errors:
+        raise errors[0]
 
-        if not add_label_to_card(token, card_id_planka, label_id):
-            log_message(f"Failed to bind label '{label_name}' ({planka_color}) to a card")
-        else:
-            log_message(f"The label '{label_name if label_name else '(no name)'}' ({planka_color}) has been added")
+    flush()
+    journal.mark_done("board", board['id'])
+    journal.set_last_activity(board['id'], board.get('dateLastActivity'))
+    return counts
+
+# Function: transfers one board from its index, or page by page if it has been read without one (--stream)
+def migrate_board_any(board, board_planka, item_executor):
+    if 'index' in board:
+        return migrate_board(board, board_planka, item_executor)
+    return migrate_board_stream(board, board_planka, item_executor)
+
+# Thread pool of the card contents in a worker process (see init_worker)
+worker_item_executor = None
+
+# Function: prepares a worker process of a multi-process migration: its own log files, the servers and journal of the coordinator
+# and its share of the request rate limits, and the HTTP cache of Trello responses if the coordinator uses one
+def init_worker(journal_path, trello_url, planka_url, trello_rate, planka_rate, cache_settings):
+    global worker_item_executor
+    start_worker_log(f"worker{os.getpid()}")
+    trello_client.base_url = trello_url
+    planka_client.base_url = planka_url
+    trello_bucket.set_rate(trello_rate)
+    planka_bucket.set_rate(planka_rate)
+    if cache_settings:
+        trello_cache.open(*cache_settings) # --http-cache and --offline apply to the workers too
+    journal.open(journal_path, resume=True) # the journal of the coordinator, shared by all processes
+    connect()
+    worker_item_executor = ThreadPoolExecutor(max_workers=CARD_ITEM_WORKERS)
+    attachment_scheduler.start()
 
-# Main migration function (minimum time.sleep parameter recommended by api Trello ≥ 0.1. You can change it to speed up migration)
-def migrate_workspaces():
-    token = get_token()
-    log_message(f"Received bearer token {token} Planka, successful authorisation on the server")
-    trello_counts = count_trello_items()
+# Function: migrates one board in a worker process and returns its counts with the progress and metrics gathered meanwhile
+def migrate_board_in_worker(board, board_planka):
+    counts = migrate_board_any(board, board_planka, worker_item_executor)
+    return counts, take_progress(), take_metrics()
+
+# Workspace id -> Planka project id of a sharded migration: written by shard 0, read by the other shards (shared by the hosts)
+SHARD_MAP_FILE = os.path.join(BASE_DIR, "shard_projects.json")
+
+# Function: reads the project map of a sharded migration (empty while shard 0 has not written it)
+def read_shard_map(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# Function: publishes the Planka project of a workspace to the other shards (shard 0 only; the file is replaced atomically)
+def publish_project(path, ws, project):
+    projects = read_shard_map(path)
+    projects[ws['id']] = project['id']
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(projects, f, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+# Function: returns the Planka project of a workspace created by shard 0 of a sharded migration, waiting until shard 0 has
+# published it in the project map (matched by workspace id, so projects of the same name are never confused)
+def wait_for_project(ws, path, timeout=600):
+    planka_id = journal.lookup("project", ws['id'])
+    if planka_id:
+        return {"id": planka_id}
+    deadline = time.monotonic() + timeout
+    while True:
+        project_id = read_shard_map(path).get(ws['id'])
+        if project_id:
+            journal.record("project", ws['id'], project_id)
+            return {"id": project_id}
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Error: the project {ws['displayName']} has not been published by shard 0 in {path}")
+        log_message(f"Waiting for shard 0 to create the project {ws['displayName']}")
+        time.sleep(5)
+
+# Main migration function (request rates are set by the limits in config.py). With processes > 1 the boards are migrated by
+# that many worker processes sharing the journal and the rate limits. With shard (index, count) only shard 0 creates the projects
+# and publishes them in the shard_map file, where the other shards find them.
+# With stream the boards are not read in advance but page by page while they are migrated (see migrate_board_stream)
+def migrate_workspaces(snapshot=None, resume=False, journal_path=JOURNAL_FILE, processes=1, shard=None, stream=False, shard_map=SHARD_MAP_FILE):
+    connect()
+    journal.open(journal_path, resume=resume) # with resume, objects created by a previous run are skipped
+    if snapshot is None:
+        snapshot = crawl_trello(with_index=not stream) # a single crawl of Trello is shared by the totals, the migration and the final report
+    streamed = any('index' not in board for ws in snapshot["workspaces"] for board in ws['boards'])
+    trello_counts = count_trello_items(snapshot)
     
-    log_message("\nDiscovered elements in Trello:")
-    log_message(f"Total workspaces found in Trello: {trello_counts['workspaces']}")
-    log_message(f"Total boards found on Trello: {trello_counts['boards']}")
-    log_message(f"Total lists found in Trello: {trello_counts['lists']}")
-    log_message(f"Total cards found in Trello: {trello_counts['cards']}")
-    log_message(f"Total attachments found in Trello: {trello_counts['attachments']}")
-    log_message(f"Total comments found in Trello: {trello_counts['comments']}")
-
-    workspaces = get_workspaces() 
+    log_message("\nDiscovered elements in Trello:", console=True)
+    log_message(f"Total workspaces found in Trello: {trello_counts['workspaces']}", console=True)
+    log_message(f"Total boards found on Trello: {trello_counts['boards']}", console=True)
+    if streamed:
+        log_message("The lists, cards, attachments and comments of the boards are counted while they are streamed", console=True)
+    else:
+        log_message(f"Total lists found in Trello: {trello_counts['lists']}", console=True)
+        log_message(f"Total cards found in Trello: {trello_counts['cards']}", console=True)
+        log_message(f"Total attachments found in Trello: {trello_counts['attachments']}", console=True)
+        log_message(f"Total comments found in Trello: {trello_counts['comments']}", console=True)
+
+        set_progress_total(sum(trello_counts.values())) # every counted object ends as one event (created, skipped or failed)
+
+    workspaces = snapshot["workspaces"]
     count_workspaces = len(workspaces)
     count_boards = count_lists = count_cards = count_attachments = count_comments = 0
+    count_uploaded = count_links = 0 # attachments of boards transferred by a previous run; the others are counted by their events
+    events_before = Counter(progress)
+
+    if processes > 1:
+        board_executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker,
+                                             initargs=(journal_path, trello_client.base_url, planka_client.base_url,
+                                                       trello_bucket.max_rate / processes, planka_bucket.max_rate / processes, trello_cache.settings))
+    else:
+        board_executor = ThreadPoolExecutor(max_workers=BOARD_WORKERS)
 
-    for ws in reversed(workspaces):
-        log_message(f"migrate workspaces: {ws['displayName']}")  # migrate workspaces
-        project = create_project(token, ws['displayName'])
-        time.sleep(0.25)
-        
-        boards = get_boards(ws['id']) # board migration
-        count_boards += len(boards)
-        for board in reversed(boards):
-            log_message(f"board migration: {board['name']}")
-            board_planka = create_board(token, project['id'], board['name'])
-            time.sleep(0.25)
-            try:
-                lists = get_lists(board['id']) # list migration
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    log_message(f"A deleted board was missed: {board['name']} ({board['id']})")
+    with board_executor, ThreadPoolExecutor(max_workers=CARD_ITEM_WORKERS) as item_executor, attachment_scheduler:
+        board_futures = []
+        for ws in reversed(workspaces):
+            boards = ws['boards'] # board migration
+            if shard and shard[0] != 0:
+                if not boards:
                     continue
+                project = wait_for_project(ws, shard_map)
+            else:
+                log_message(f"migrate workspaces: {ws['displayName']}")  # migrate workspaces
+                project = create_once("project", ws['id'], create_project, ws['displayName'])
+                if shard:
+                    flush() # the other shards may use the project as soon as it is published
+                    publish_project(shard_map, ws, project)
+
+            count_boards += len(boards)
+            for i, board in enumerate(boards):
+                log_message(f"board migration: {board['name']}")
+                position = (board.get('seq', i) + 1) * POSITION_GAP # seq is the place of the board before filtering or sharding
+                board_planka = create_once("board", board['id'], create_board, project['id'], board['name'], position)
+                if journal.is_done("board", board['id']):
+                    log_message(f"The board {board['name']} was fully transferred by a previous run, skip it")
+                    board_futures.append(item_executor.submit(count_board_items, board))
+                elif processes > 1:
+                    flush() # a worker process has its own connection to the database backend, so the board must be written first
+                    board_futures.append(board_executor.submit(migrate_board_in_worker, board, {"id": board_planka['id']}))
                 else:
-                    raise
-            count_lists += len(lists)
-            for lst in reversed(lists):
-                log_message(f"list migration: {lst['name']}")
-                list_planka = create_list(token, board_planka['id'], lst['name'])
-                time.sleep(0.25)
-                
-                cards = get_cards(lst['id'])  # card migration
-                count_cards += len(cards)
-                for card in reversed(cards):
-                    due_date = card.get('due')
-                    completed = card.get('dueComplete', False)
-                    card_planka = create_card(token, list_planka['id'], card['name'], card.get('desc', ''), due_date, completed)
-                    time.sleep(0.25)
-
-                    # attachment migration
-                    attachments = get_card_attachments(card['id'], APIKEY, APITOKEN)
-                    count_attachments += len(attachments)
-                    migrate_attachments(token, card_planka['id'], card['id'])
-                    
-                    # label migration
-                    migrate_card_labels(token, board_planka['id'], card_planka['id'], card)
-                    
-                    # migration of checklists (tasks)
-                    checklists = get_card_checklists(card['id'])
-                    for checklist in reversed(checklists):
-                        for item in reversed(checklist["checkItems"]):
-                            is_completed = item["state"] == "complete"
-                            create_task(token, card_planka['id'], item["name"], is_completed)
-                            time.sleep(0.25)
-
-                    # comment migration
-                    comments = get_card_comments(card['id'])
-                    count_comments += len(comments)
-                    for comment in reversed(comments):
-                        log_message(f"Adding a comment to a card: {comment['data']['text'][:30]}...")
-                        add_comment(
-                            token,
-                            card_planka['id'],
-                            comment['data']['text'],
-                            comment['memberCreator']['fullName'],
-                            comment['memberCreator']['username'],
-                            comment['date']
-                        )
-                        time.sleep(0.25)
+                    board_futures.append(board_executor.submit(migrate_board_any, board, board_planka, item_executor))
+
+        for future in as_completed(board_futures):
+            counts = future.result()
+            if isinstance(counts, tuple): # a board migrated by a worker process
+                counts, worker_progress, worker_metrics = counts
+                merge_progress(worker_progress)
+                merge_metrics(worker_metrics)
+            count_lists += counts["lists"]
+            count_cards += counts["cards"]
+            count_attachments += counts["attachments"]
+            if "uploaded" in counts:
+                count_uploaded += counts["uploaded"]
+                count_links += counts["attachments"] - counts["uploaded"]
+            count_comments += counts["comments"]
+        flush()
     
+    if streamed: # the objects found in Trello are those read while streaming
+        trello_counts.update(lists=count_lists, cards=count_cards, attachments=count_attachments, comments=count_comments)
+    events = Counter(progress) - events_before # attachment events of this run, including those of the worker processes
+    transferred_attachments = count_uploaded + events["attachment created"] + events["attachment skipped"]
+    link_attachments = count_links + events["attachment link"]
+
     # Display the migration report
-    log_message("\nMigration complete!")
-    log_message(f"Total workspaces: {trello_counts['workspaces']} found in Trello, {count_workspaces} transferred to Planka")
-    log_message(f"Total board: {trello_counts['boards']} found in Trello, {count_boards} transferred to Planka")
-    log_message(f"Total lists: {trello_counts['lists']} found in Trello, {count_lists} transferred to Planka")
-    log_message(f"Total cards: {trello_counts['cards']} found in Trello, {count_cards} transferred to Planka")
-    log_message(f"Total attachments: {trello_counts['attachments']} found in Trello, {count_attachments} transferred to Planka")
-    log_message(f"Total comments: {trello_counts['comments']} found in Trello, {count_comments} transferred to Plankaa")
+    log_message("\nMigration complete!", console=True)
+    log_message(progress_summary(), console=True)
+    for line in summary_lines():
+        log_message(line, console=True)
+    export_metrics()
+    log_message(f"Total workspaces: {trello_counts['workspaces']} found in Trello, {count_workspaces} transferred to Planka", console=True)
+    log_message(f"Total board: {trello_counts['boards']} found in Trello, {count_boards} transferred to Planka", console=True)
+    log_message(f"Total lists: {trello_counts['lists']} found in Trello, {count_lists} transferred to Planka", console=True)
+    log_message(f"Total cards: {trello_counts['cards']} found in Trello, {count_cards} transferred to Planka", console=True)
+    log_message(f"Total attachments: {trello_counts['attachments']} found in Trello, {transferred_attachments} transferred to Planka"
+                + (f", {link_attachments} links skipped" if link_attachments else ""), console=True)
+    log_message(f"Total comments: {trello_counts['comments']} found in Trello, {count_comments} transferred to Plankaa", console=True)
 
     # Shows a warning if something has not been transferred
     if (trello_counts['cards'] > count_cards or 
-        trello_counts['attachments'] > count_attachments or 
+        trello_counts['attachments'] > transferred_attachments + link_attachments or 
         trello_counts['comments'] > count_comments):
-        log_message("WARNING: Not all data has been migrated! Check the log for errors")
\ No newline at end of file
+        log_message("WARNING: Not all data has been migrated! Check the log for errors", console=True)
\ No newline at end of file
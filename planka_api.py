@@ -1,53 +1,63 @@
-import requests
 import unidecode
 import datetime
+import itertools
 import os
+import uuid
 import pytz
-from config import PLANKA_URL
 from utils import log_message
+from http_client import planka_client
+from journal import journal
+
+# Function: signs in to Planka
+def connect():
+    planka_client.login()
+
+# Function: nothing to write, every request is sent at once (the database backend writes its pending batch here)
+def flush():
+    pass
+
+# Function: records a created or updated object in the journal (the REST API has written it once the request returns)
+def record(object_type, trello_id, planka_id, fingerprint=None):
+    journal.record(object_type, trello_id, planka_id, fingerprint)
 
 # Function: creating a project in Planka
-def create_project(token, name="test"):
-    url = f"{PLANKA_URL}/projects"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+def create_project(name="test"):
+    url = "/projects"
     payload = {"name": name, "description": "Imported from Trello", "isPublic": False}
-    response = requests.post(url, json=payload, headers=headers)
+    response = planka_client.request("POST", url, json=payload)
     response.raise_for_status()
     return response.json()["item"]
 
 # Function: creating a board in Planka
-def create_board(token, project_id, name="test"):
+def create_board(project_id, name="test", position=0):
     if not project_id:
         raise ValueError("Error: project_id is empty, board cannot be created!")
-    url = f"{PLANKA_URL}/projects/{project_id}/boards"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    payload = {"name": name, "position": 0, "isPublic": False}
-    response = requests.post(url, json=payload, headers=headers)
+    url = f"/projects/{project_id}/boards"
+    payload = {"name": name, "position": position, "isPublic": False}
+    response = planka_client.request("POST", url, json=payload)
     response.raise_for_status()
     return response.json()["item"]
 
 # Function: creating a list in Planka
-def create_list(token, board_id, name="test"):
+def create_list(board_id, name="test", position=0):
     if not board_id:
         raise ValueError("Error: board_id is empty, list could not be created!")
-    url = f"{PLANKA_URL}/boards/{board_id}/lists"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    payload = {"name": name, "position": 0, "boardId": board_id}
-    response = requests.post(url, json=payload, headers=headers)
+    url = f"/boards/{board_id}/lists"
+    payload = {"name": name, "position": position, "boardId": board_id}
+    response = planka_client.request("POST", url, json=payload)
     response.raise_for_status()
     return response.json()["item"]
 
 # Function: creating a card in Planka
-def create_card(token, list_id, name, description=None, due_date=None, completed=False):
+def create_card(list_id, name, description=None, due_date=None, completed=False, position=0):
     if not list_id:
         raise ValueError("Error: list_id is empty, card cannot be created!")
 
-    url = f"{PLANKA_URL}/lists/{list_id}/cards"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    url = f"/lists/{list_id}/cards"
 
     payload = {
         "name": name,
-        "position": 0,
+        "position": position,
         "listId": list_id,
         "isDueDateCompleted": completed
     }
@@ -57,72 +67,167 @@ def create_card(token, list_id, name, description=None, due_date=None, completed
     if description:
         payload["description"] = description
 
-    log_message(f"Card migration: {name}")
+    log_message(f"Card migration: {name}", "DEBUG")
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = planka_client.request("POST", url, json=payload)
 
     if response.status_code not in [200, 201]:
-        log_message(f"Error when creating a card: {response.status_code} - {response.text}")
+        log_message(f"Error when creating a card: {response.status_code} - {response.text}", "ERROR")
         response.raise_for_status()
 
     return response.json()["item"]
 
 # Function: creating a task in a card in Planka (with status saved as completed/uncompleted)
-def create_task(token, card_id, name="test task", is_completed=False):
+def create_task(card_id, name="test task", is_completed=False, position=0):
     if not card_id:
         raise ValueError("Error: card_id is empty, task cannot be created!")
 
-    url = f"{PLANKA_URL}/cards/{card_id}/tasks"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    url = f"/cards/{card_id}/tasks"
     payload = {
         "cardId": card_id,
         "name": name,
         "isCompleted": is_completed,
-        "position": 0
+        "position": position
     }
-    response = requests.post(url, json=payload, headers=headers)
+    response = planka_client.request("POST", url, json=payload)
     response.raise_for_status()
     return response.json()["item"]
 
-# Function: creating a comment in a card in Planka (with signature author, date, time of creation in Trello)
-def add_comment(token, card_id, text, author_name, author_username, date):
+# Function: adds the signature (author, date and time of creation in Trello) to the text of a comment
+def format_comment(text, author_name, author_username, date):
     try:
         formatted_date = datetime.datetime.fromisoformat(date.replace("Z", "")).strftime("%d-%m-%Y %H:%M:%S")
     except ValueError:
         formatted_date = date
 
-    formatted_text = f"""{text}
+    return f"""{text}
 
 ---
 *Imported comment from Trello, originally posted by*  
 {author_name} ({author_username})  
 {formatted_date}"""
 
-    url = f"{PLANKA_URL}/cards/{card_id}/comment-actions"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+# Function: creating a comment in a card in Planka (with signature author, date, time of creation in Trello)
+def add_comment(card_id, text, author_name, author_username, date):
+    formatted_text = format_comment(text, author_name, author_username, date)
+
+    url = f"/cards/{card_id}/comment-actions"
     payload = {"text": formatted_text, "cardId": card_id}
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = planka_client.request("POST", url, json=payload)
+    response.raise_for_status()
+    return response.json()["item"]
+
+# Function: renames and moves a list in Planka
+def update_list(list_id, name, position=None):
+    url = f"/lists/{list_id}"
+    payload = {"name": name}
+    if position is not None:
+        payload["position"] = position
+    response = planka_client.request("PATCH", url, json=payload)
+    response.raise_for_status()
+    return response.json()["item"]
+
+# Function: updates the fields of a card in Planka and moves it if its current list (or board) differs
+def update_card(card_id, board_id, list_id, name, description=None, due_date=None, completed=False, position=None):
+    url = f"/cards/{card_id}"
+    payload = {
+        "boardId": board_id,
+        "listId": list_id,
+        "name": name,
+        "description": description or None,
+        "dueDate": due_date,
+        "isDueDateCompleted": completed
+    }
+    if position is not None:
+        payload["position"] = position
+    response = planka_client.request("PATCH", url, json=payload)
     response.raise_for_status()
     return response.json()["item"]
 
-# Function: creating card attachments in Planka (with signature date and time of creation in Trello)
-def add_attachment(token, card_id, file_path, original_date):
+# Function: updates the name, the completion status and the position of a task in Planka
+def update_task(task_id, name, is_completed=False, position=None):
+    url = f"/tasks/{task_id}"
+    payload = {"name": name, "isCompleted": is_completed}
+    if position is not None:
+        payload["position"] = position
+    response = planka_client.request("PATCH", url, json=payload)
+    response.raise_for_status()
+    return response.json()["item"]
+
+# Function: replaces the text of an imported comment in Planka (the signature is written again)
+def update_comment(comment_id, text, author_name, author_username, date):
+    url = f"/comment-actions/{comment_id}"
+    payload = {"text": format_comment(text, author_name, author_username, date)}
+    response = planka_client.request("PATCH", url, json=payload)
+    response.raise_for_status()
+    return response.json()["item"]
+
+# Function: creating card attachments in Planka from a file on disk (with signature date and time of creation in Trello)
+def add_attachment(card_id, file_path, original_date, file_name=None):
     if original_date:
-        log_message(f"The original date the file was uploaded to Trello: {original_date}")
+        log_message(f"The original date the file was uploaded to Trello: {original_date}", "DEBUG")
 
-    url = f"{PLANKA_URL}/cards/{card_id}/attachments"
-    headers = {"Authorization": f"Bearer {token}"}
+    url = f"/cards/{card_id}/attachments"
 
     with open(file_path, "rb") as file:
-        files = {"file": file}
-        response = requests.post(url, headers=headers, files=files)
+        files = {"file": (file_name or os.path.basename(file_path), file)}
+        response = planka_client.request("POST", url, files=files)
         response.raise_for_status()
 
     attachment = response.json()["item"]
 
     return attachment
 
+# Multipart/form-data body that is read from an iterator of chunks, so a file of known size is uploaded without being held in memory or on disk
+class MultipartStream:
+    def __init__(self, field, file_name, chunks, size):
+        boundary = uuid.uuid4().hex
+        safe_name = file_name.replace('"', "%22")
+        head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{safe_name}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.length = len(head) + size + len(tail)
+        self.parts = itertools.chain([head], chunks, [tail])
+        self.buffer = b""
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = self.read(64 * 1024)
+        if not chunk:
+            raise StopIteration
+        return chunk
+
+    # Function: returns up to size bytes of the body (the whole rest of it if size is negative)
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            part = next(self.parts, None)
+            if part is None:
+                break
+            self.buffer += part
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+# Function: creating card attachments in Planka from a stream of chunks of known size (the stream cannot be sent twice, so the request is not retried)
+def add_attachment_stream(card_id, file_name, chunks, size, original_date):
+    if original_date:
+        log_message(f"The original date the file was uploaded to Trello: {original_date}", "DEBUG")
+
+    url = f"/cards/{card_id}/attachments"
+    body = MultipartStream("file", file_name, chunks, size)
+    response = planka_client.request("POST", url, data=body, headers={"Content-Type": body.content_type}, max_retries=0)
+    response.raise_for_status()
+
+    return response.json()["item"]
+
 # Function: converts the file name to Latin if there are non-Latin characters (file name transliteration)
 def transliterate_filename(filename):
     base, ext = os.path.splitext(filename)
@@ -138,45 +243,58 @@ def convert_to_trello_timezone(utc_time_str, trello_tz="Europe/Moscow"): # set y
     return local_dt.strftime("%d-%m-%Y %H-%M")
 
 # Function: create a label in Planka (if it does not exist)
-def create_label(token, board_id, name, color):
-    url = f"{PLANKA_URL}/boards/{board_id}/labels"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+def create_label(board_id, name, color, position=0):
+    url = f"/boards/{board_id}/labels"
     
     payload = {
         "boardId": board_id,
-        "position": 0,
+        "position": position,
         "color": color
     }
     
     if name.strip():
         payload["name"] = name
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = planka_client.request("POST", url, json=payload)
 
     if response.status_code in [200, 201]:
         return response.json().get("item")
 
-    log_message(f"Label creation error: {response.status_code} - {response.text}")
+    log_message(f"Label creation error: {response.status_code} - {response.text}", "ERROR")
     return None
 
+# Function: retrieves the labels that already exist on a Planka board
+def get_board_labels(board_id):
+    return get_board(board_id).get("included", {}).get("labels", [])
+
+# Function: retrieves a board with its included lists, cards, labels, card labels, tasks and attachments in one request
+def get_board(board_id):
+    response = planka_client.request("GET", f"/boards/{board_id}")
+    response.raise_for_status()
+    return response.json()
+
+# Function: retrieves the comments of a card in Planka
+def get_card_comments(card_id):
+    response = planka_client.request("GET", f"/cards/{card_id}/actions")
+    response.raise_for_status()
+    return [action for action in response.json()["items"] if action.get("type") == "commentCard"]
+
 # Function: add an existing tag to a card in Planka (tag binding)
-def add_label_to_card(token, card_id, label_id):
-    url = f"{PLANKA_URL}/cards/{card_id}/labels"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+def add_label_to_card(card_id, label_id):
+    url = f"/cards/{card_id}/labels"
     payload = {"labelId": label_id}
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = planka_client.request("POST", url, json=payload)
 
     if response.status_code in [200, 201]:
         return response.json().get("item")
     return None
 
 # Function: update/delete the cover in a card in Planka (if it has not been assigned in a card in Trello)
-def update_card_cover(token, card_id, cover_attachment_id):
-    url = f"{PLANKA_URL}/cards/{card_id}"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+def update_card_cover(card_id, cover_attachment_id):
+    url = f"/cards/{card_id}"
     payload = {"coverAttachmentId": cover_attachment_id if cover_attachment_id else None}
 
-    response = requests.patch(url, json=payload, headers=headers)
+    response = planka_client.request("PATCH", url, json=payload)
     response.raise_for_status()
-    log_message(f"Transferred and installed the card cover")
\ No newline at end of file
+    log_message(f"Transferred and installed the card cover", "DEBUG")
\ No newline at end of file
@@ -0,0 +1,32 @@
+from config import PLANKA_BACKEND
+
+# The writer of the migration, chosen by PLANKA_BACKEND in config.py: the Planka REST API, or a bulk load straight into the
+# PostgreSQL database of Planka for very large imports. Both modules offer the same functions
+if PLANKA_BACKEND == "database":
+    import planka_db as backend
+elif PLANKA_BACKEND == "api":
+    import planka_api as backend
+else:
+    raise ValueError(f"Error: unknown PLANKA_BACKEND {PLANKA_BACKEND!r}, use 'api' or 'database'")
+
+connect = backend.connect
+flush = backend.flush
+record = backend.record
+create_project = backend.create_project
+create_board = backend.create_board
+create_list = backend.create_list
+create_card = backend.create_card
+create_task = backend.create_task
+add_comment = backend.add_comment
+update_list = backend.update_list
+update_card = backend.update_card
+update_task = backend.update_task
+update_comment = backend.update_comment
+add_attachment = backend.add_attachment
+add_attachment_stream = backend.add_attachment_stream
+create_label = backend.create_label
+get_board = backend.get_board
+get_board_labels = backend.get_board_labels
+get_card_comments = backend.get_card_comments
+add_label_to_card = backend.add_label_to_card
+update_card_cover = backend.update_card_cover
\ No newline at end of file
@@ -0,0 +1,341 @@
+import datetime
+import os
+import shutil
+import threading
+import time
+import uuid
+from config import USERNAME
+from config import PLANKA_DATABASE_URL, PLANKA_ATTACHMENTS_DIR, PLANKA_DATABASE_BATCH_SIZE
+from utils import log_message
+from journal import journal
+from planka_api import format_comment
+
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError: # only needed with PLANKA_BACKEND = "database"
+    psycopg2 = None
+
+# Columns written to the tables of Planka 1.x, in the order of their foreign keys (a batch is inserted table by table in this order)
+TABLES = {
+    "project": ("id", "name", "created_at"),
+    "project_manager": ("id", "project_id", "user_id", "created_at"),
+    "board": ("id", "project_id", "position", "name", "created_at"),
+    "board_membership": ("id", "board_id", "user_id", "role", "created_at"),
+    "list": ("id", "board_id", "position", "name", "created_at"),
+    "label": ("id", "board_id", "name", "color", "position", "created_at"),
+    "card": ("id", "board_id", "list_id", "creator_user_id", "position", "name", "description", "due_date", "is_due_date_completed", "created_at"),
+    "card_label": ("id", "card_id", "label_id", "created_at"),
+    "task": ("id", "card_id", "name", "is_completed", "position", "created_at"),
+    "action": ("id", "card_id", "user_id", "type", "data", "created_at"),
+    "attachment": ("id", "card_id", "creator_user_id", "dirname", "filename", "name", "created_at"),
+}
+
+# Function: converts a Trello date (ISO 8601 in UTC) to the naive UTC timestamp Planka stores, or returns the current time
+def utc_timestamp(value=None):
+    if value:
+        try:
+            return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            pass
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+# Function: formats a timestamp of the database like the REST API does
+def api_timestamp(value):
+    return value.isoformat(timespec="milliseconds") + "Z" if value else None
+
+# Bulk writer into the PostgreSQL database of Planka. Ids are reserved from Planka's own next_id() in blocks, so every object gets
+# its id at once (the journal and the cards inside a board need it) while the rows themselves are kept in memory and inserted
+# PLANKA_DATABASE_BATCH_SIZE at a time with multi-row INSERTs in one transaction. Updates are queued behind the inserts of the same
+# batch, and every read writes the pending batch first. The journal records of the rows and updates of a batch wait with it and are
+# written only once its transaction has committed, so rows lost in a failed batch or when the script stops are not in the journal
+# and a --resume run transfers them again
+class PlankaDatabase:
+    def __init__(self):
+        self.connection = None
+        self.pid = None
+        self.lock = threading.RLock()
+        self.user_id = None
+        self.ids = []
+        self.rows = {table: [] for table in TABLES}
+        self.updates = []
+        self.pending = 0
+        self.records = [] # journal records of the pending batch
+        self.pending_ids = set() # rows inserted or updated by the pending batch
+        self.lost_ids = set() # rows of the batches that could not be written
+        self.list_boards = {} # Planka list id -> board id, for the cards created in it
+
+    # Function: connects to the database (again in every worker process) and finds the Planka user the objects are created by
+    def open(self):
+        with self.lock:
+            if self.connection is not None and self.pid == os.getpid():
+                return
+            if psycopg2 is None:
+                raise ImportError("Error: PLANKA_BACKEND = 'database' needs psycopg2 (pip install psycopg2-binary)")
+            self.connection = psycopg2.connect(PLANKA_DATABASE_URL)
+            self.pid = os.getpid()
+            self.ids = []
+            self.rows = {table: [] for table in TABLES}
+            self.updates = []
+            self.pending = 0
+            self.records = []
+            self.pending_ids = set()
+            with self.connection, self.connection.cursor() as cursor:
+                cursor.execute("SELECT id FROM user_account WHERE (username = %s OR email = %s) AND deleted_at IS NULL", (USERNAME, USERNAME))
+                row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Error: the Planka user {USERNAME} does not exist in the database")
+            self.user_id = row[0]
+            log_message(f"Writing to the Planka database directly as the user {USERNAME}, {PLANKA_DATABASE_BATCH_SIZE} rows per transaction")
+
+    # Function: returns a new Planka id, reserving the next block of ids from the database when the current one is used up
+    def next_id(self):
+        with self.lock:
+            self.open()
+            if not self.ids:
+                with self.connection, self.connection.cursor() as cursor:
+                    cursor.execute("SELECT next_id() FROM generate_series(1, %s)", (PLANKA_DATABASE_BATCH_SIZE,))
+                    self.ids = [row[0] for row in cursor.fetchall()][::-1]
+            return self.ids.pop()
+
+    # Function: adds a row to the pending batch (the batch is written once it is full) and returns the id of the row
+    def insert(self, table, **values):
+        with self.lock:
+            values.setdefault("id", self.next_id())
+            values.setdefault("created_at", utc_timestamp())
+            self.rows[table].append(tuple(values[column] for column in TABLES[table]))
+            self.pending_ids.add(values["id"])
+            self.pending += 1
+            if self.pending >= PLANKA_DATABASE_BATCH_SIZE:
+                self.flush()
+        return values["id"]
+
+    # Function: queues an UPDATE of the row row_id behind the inserts of the pending batch (so it may change a row that is not written yet)
+    def update(self, sql, params, row_id):
+        with self.lock:
+            self.open()
+            self.updates.append((sql, params))
+            self.pending_ids.add(row_id)
+            self.pending += 1
+            if self.pending >= PLANKA_DATABASE_BATCH_SIZE:
+                self.flush()
+
+    # Function: records an object in the journal once its row is written: with the pending batch if the row is in it, at once if
+    # it is already written, never if it was lost in a failed batch
+    def record(self, object_type, trello_id, planka_id, fingerprint=None):
+        with self.lock:
+            row_id = int(planka_id)
+            if row_id in self.lost_ids:
+                log_message(f"Planka database: the {object_type} {trello_id} was lost with a failed batch and is not recorded", "ERROR")
+                return
+            if row_id in self.pending_ids:
+                self.records.append((object_type, trello_id, planka_id, fingerprint))
+                return
+        journal.record(object_type, trello_id, planka_id, fingerprint)
+
+    # Function: writes the pending batch in one transaction (the inserts table by table, then the updates) and then its journal
+    # records. A batch that fails is rolled back and dropped with its journal records, and the objects lost with it are reported
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            started = time.monotonic()
+            try:
+                with self.connection, self.connection.cursor() as cursor:
+                    for table, columns in TABLES.items():
+                        if self.rows[table]:
+                            psycopg2.extras.execute_values(cursor, f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES %s',
+                                                           self.rows[table], page_size=PLANKA_DATABASE_BATCH_SIZE)
+                    for sql, params in self.updates:
+                        cursor.execute(sql, params)
+            except psycopg2.Error as e:
+                lost = ", ".join(f"{object_type} {trello_id}" for object_type, trello_id, _, _ in self.records) or "no recorded objects"
+                log_message(f"Planka database: a batch of {self.pending} rows could not be written and is dropped ({e}), lost: {lost}", "ERROR")
+                self.lost_ids |= self.pending_ids
+            else:
+                log_message(f"Planka database: {self.pending} rows written in {time.monotonic() - started:.2f} sec", "DEBUG")
+                for record in self.records:
+                    journal.record(*record)
+            self.rows = {table: [] for table in TABLES}
+            self.updates = []
+            self.pending = 0
+            self.records = []
+            self.pending_ids = set()
+
+    # Function: runs a query after writing the pending batch and returns its rows as dictionaries
+    def query(self, sql, params=()):
+        with self.lock:
+            self.open()
+            self.flush()
+            with self.connection, self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+
+    # Function: returns the board of a list, remembered from its creation or read from the database
+    def board_of_list(self, list_id):
+        if list_id not in self.list_boards:
+            rows = self.query('SELECT board_id FROM "list" WHERE id = %s', (list_id,))
+            if not rows:
+                raise ValueError(f"Error: the list {list_id} does not exist in the Planka database")
+            self.list_boards[list_id] = rows[0]["board_id"]
+        return self.list_boards[list_id]
+
+    # Function: stores the file of an attachment in the attachment directory of Planka (write(path) writes its content)
+    def store_attachment(self, card_id, file_name, write, original_date):
+        dirname = str(uuid.uuid4())
+        filename = file_name.replace("/", "_").replace("\\", "_")
+        os.makedirs(os.path.join(PLANKA_ATTACHMENTS_DIR, dirname))
+        write(os.path.join(PLANKA_ATTACHMENTS_DIR, dirname, filename))
+        attachment_id = self.insert("attachment", card_id=int(card_id), creator_user_id=self.user_id, dirname=dirname, filename=filename,
+                                    name=file_name, created_at=utc_timestamp(original_date))
+        return {"id": str(attachment_id), "name": file_name}
+
+planka_database = PlankaDatabase()
+
+# Function: connects to the Planka database
+def connect():
+    planka_database.open()
+
+# Function: writes the pending batch (called before an object is marked as fully transferred in the journal). Once a batch has been
+# lost nothing is marked as done any more: the run stops, and --resume transfers the lost objects
+def flush():
+    planka_database.flush()
+    if planka_database.lost_ids:
+        raise RuntimeError(f"Error: {len(planka_database.lost_ids)} rows could not be written to the Planka database (see log.txt), "
+                           "run python main.py --resume to transfer them")
+
+# Function: records a created or updated object in the journal once its row is written to the database
+def record(object_type, trello_id, planka_id, fingerprint=None):
+    planka_database.record(object_type, trello_id, planka_id, fingerprint)
+
+# Function: creating a project, managed by the user of the migration
+def create_project(name="test"):
+    project_id = planka_database.insert("project", name=name)
+    planka_database.insert("project_manager", project_id=project_id, user_id=planka_database.user_id)
+    return {"id": str(project_id), "name": name}
+
+# Function: creating a board, with the user of the migration as its editor
+def create_board(project_id, name="test", position=0):
+    board_id = planka_database.insert("board", project_id=int(project_id), position=position, name=name)
+    planka_database.insert("board_membership", board_id=board_id, user_id=planka_database.user_id, role="editor")
+    return {"id": str(board_id), "name": name}
+
+# Function: creating a list
+def create_list(board_id, name="test", position=0):
+    list_id = planka_database.insert("list", board_id=int(board_id), position=position, name=name)
+    planka_database.list_boards[list_id] = int(board_id)
+    return {"id": str(list_id), "name": name}
+
+# Function: creating a card
+def create_card(list_id, name, description=None, due_date=None, completed=False, position=0):
+    if not list_id:
+        raise ValueError("Error: list_id is empty, card cannot be created!")
+    card_id = planka_database.insert("card", board_id=planka_database.board_of_list(int(list_id)), list_id=int(list_id),
+                                     creator_user_id=planka_database.user_id, position=position, name=name, description=description or None,
+                                     due_date=utc_timestamp(due_date) if due_date else None, is_due_date_completed=completed)
+    return {"id": str(card_id), "name": name}
+
+# Function: creating a task in a card
+def create_task(card_id, name="test task", is_completed=False, position=0):
+    task_id = planka_database.insert("task", card_id=int(card_id), name=name, is_completed=is_completed, position=position)
+    return {"id": str(task_id), "name": name}
+
+# Function: adding a comment, dated when it was posted in Trello
+def add_comment(card_id, text, author_name, author_username, date):
+    data = psycopg2.extras.Json({"text": format_comment(text, author_name, author_username, date)})
+    comment_id = planka_database.insert("action", card_id=int(card_id), user_id=planka_database.user_id, type="commentCard", data=data,
+                                        created_at=utc_timestamp(date))
+    return {"id": str(comment_id)}
+
+# Function: updates the name and the position of a list
+def update_list(list_id, name, position=None):
+    planka_database.update('UPDATE "list" SET name = %s, position = COALESCE(%s, position), updated_at = %s WHERE id = %s',
+                           (name, position, utc_timestamp(), int(list_id)), int(list_id))
+    return {"id": list_id}
+
+# Function: updates the fields, the list and the position of a card
+def update_card(card_id, board_id, list_id, name, description=None, due_date=None, completed=False, position=None):
+    planka_database.update('UPDATE "card" SET board_id = %s, list_id = %s, name = %s, description = %s, due_date = %s, is_due_date_completed = %s, '
+                           'position = COALESCE(%s, position), updated_at = %s WHERE id = %s',
+                           (int(board_id), int(list_id), name, description or None, utc_timestamp(due_date) if due_date else None, completed,
+                            position, utc_timestamp(), int(card_id)), int(card_id))
+    return {"id": card_id}
+
+# Function: updates the name, the completion status and the position of a task
+def update_task(task_id, name, is_completed=False, position=None):
+    planka_database.update('UPDATE "task" SET name = %s, is_completed = %s, position = COALESCE(%s, position), updated_at = %s WHERE id = %s',
+                           (name, is_completed, position, utc_timestamp(), int(task_id)), int(task_id))
+    return {"id": task_id}
+
+# Function: updates the text of an imported comment
+def update_comment(comment_id, text, author_name, author_username, date):
+    data = psycopg2.extras.Json({"text": format_comment(text, author_name, author_username, date)})
+    planka_database.update('UPDATE "action" SET data = %s, updated_at = %s WHERE id = %s', (data, utc_timestamp(), int(comment_id)), int(comment_id))
+    return {"id": comment_id}
+
+# Function: copies a file into the attachment storage of Planka and attaches it to a card
+def add_attachment(card_id, file_path, original_date, file_name=None):
+    return planka_database.store_attachment(card_id, file_name or os.path.basename(file_path),
+                                            lambda path: shutil.copyfile(file_path, path), original_date)
+
+# Function: writes a stream of chunks into the attachment storage of Planka and attaches the file to a card
+def add_attachment_stream(card_id, file_name, chunks, size, original_date):
+    def write(path):
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    return planka_database.store_attachment(card_id, file_name, write, original_date)
+
+# Function: creating a label on a board
+def create_label(board_id, name, color, position=0):
+    label_id = planka_database.insert("label", board_id=int(board_id), name=name or None, color=color, position=position)
+    return {"id": str(label_id), "name": name, "color": color}
+
+# Function: returns a board with its lists, cards, labels, card labels, tasks and attachments, shaped like the REST API response
+# (a board missing from the database has nothing included)
+def get_board(board_id):
+    board_id = int(board_id)
+    boards = planka_database.query('SELECT id, name FROM "board" WHERE id = %s', (board_id,))
+    if not boards:
+        return {"item": None, "included": {}}
+    card_ids = 'SELECT id FROM "card" WHERE board_id = %s'
+    return {
+        "item": {"id": str(boards[0]["id"]), "name": boards[0]["name"]},
+        "included": {
+            "lists": [{"id": str(row["id"]), "name": row["name"]}
+                      for row in planka_database.query('SELECT id, name FROM "list" WHERE board_id = %s', (board_id,))],
+            "cards": [{"id": str(row["id"]), "listId": str(row["list_id"]), "name": row["name"], "description": row["description"],
+                       "dueDate": api_timestamp(row["due_date"]), "isDueDateCompleted": row["is_due_date_completed"]}
+                      for row in planka_database.query('SELECT id, list_id, name, description, due_date, is_due_date_completed FROM "card" '
+                                                       'WHERE board_id = %s', (board_id,))],
+            "labels": [{"id": str(row["id"]), "name": row["name"], "color": row["color"]}
+                       for row in planka_database.query('SELECT id, name, color FROM "label" WHERE board_id = %s', (board_id,))],
+            "cardLabels": [{"cardId": str(row["card_id"]), "labelId": str(row["label_id"])}
+                           for row in planka_database.query(f'SELECT card_id, label_id FROM "card_label" WHERE card_id IN ({card_ids})', (board_id,))],
+            "tasks": [{"id": str(row["id"]), "name": row["name"], "isCompleted": row["is_completed"]}
+                      for row in planka_database.query(f'SELECT id, name, is_completed FROM "task" WHERE card_id IN ({card_ids})', (board_id,))],
+            "attachments": [{"id": str(row["id"])}
+                            for row in planka_database.query(f'SELECT id FROM "attachment" WHERE card_id IN ({card_ids})', (board_id,))],
+        }
+    }
+
+# Function: retrieves the labels of a board
+def get_board_labels(board_id):
+    return [{"id": str(row["id"]), "name": row["name"], "color": row["color"]}
+            for row in planka_database.query('SELECT id, name, color FROM "label" WHERE board_id = %s', (int(board_id),))]
+
+# Function: retrieves the comments of a card
+def get_card_comments(card_id):
+    return [{"id": str(row["id"]), "type": "commentCard", "data": row["data"]}
+            for row in planka_database.query('SELECT id, data FROM "action" WHERE card_id = %s AND type = %s', (int(card_id), "commentCard"))]
+
+# Function: binds a label to a card
+def add_label_to_card(card_id, label_id):
+    card_label_id = planka_database.insert("card_label", card_id=int(card_id), label_id=int(label_id))
+    return {"id": str(card_label_id)}
+
+# Function: sets the cover of a card (an attachment of it, or None)
+def update_card_cover(card_id, cover_attachment_id):
+    planka_database.update('UPDATE "card" SET cover_attachment_id = %s WHERE id = %s',
+                           (int(cover_attachment_id) if cover_attachment_id else None, int(card_id)), int(card_id))
+    log_message("Transferred and installed the card cover", "DEBUG")
\ No newline at end of file
@@ -0,0 +1,117 @@
+import datetime
+import heapq
+from config import BOARD_WORKERS, CARD_ITEM_WORKERS
+from config import TRELLO_REQUESTS_PER_10_SECONDS, PLANKA_REQUESTS_PER_SECOND
+from config import PLAN_REQUEST_SECONDS, PLAN_BANDWIDTH_MB_PER_SECOND
+from config import ATTACHMENT_SMALL_WORKERS, ATTACHMENT_LARGE_WORKERS, ATTACHMENT_LARGE_BYTES
+
+PLAN_TYPES = ["projects", "boards", "lists", "cards", "tasks", "comments", "labels", "label_bindings", "attachments"]
+
+# Function: returns the time needed to run jobs of the given durations on a number of parallel workers (longest jobs first)
+def schedule_length(durations, workers):
+    finish = [0.0] * max(1, workers)
+    for duration in sorted(durations, reverse=True):
+        heapq.heappush(finish, heapq.heappop(finish) + duration)
+    return max(finish)
+
+# Function: counts the Planka requests the migration of a snapshot will make, the attachment bytes and the projected duration.
+# The target Planka is assumed to be empty and the journal cleared; nothing is sent to Planka
+def plan_migration(snapshot, crawl=False, processes=1):
+    creates = dict.fromkeys(PLAN_TYPES, 0)
+    other_planka = {"login": 1, "label_lookups": 0, "cover_updates": 0}
+    trello = {"crawl": 0, "downloads": 0}
+    attachment_bytes = link_attachments = 0
+    board_chains = [] # sequential part of each board: label lookup, labels and lists
+    card_jobs = [] # jobs submitted to the card item workers, in requests and bytes
+    attachment_jobs = {"small": [], "large": []} # transfers on the lanes of the attachment scheduler, in requests and bytes
+
+    if crawl:
+        trello["crawl"] = 1 + len(snapshot["workspaces"]) # organizations and the boards of each
+
+    for ws in snapshot["workspaces"]:
+        creates["projects"] += 1
+        creates["boards"] += len(ws["boards"])
+
+        for board in ws["boards"]:
+            board_index = board["index"]
+            board_label_ids = {label["id"] for label in board_index["labels"]}
+            creates["labels"] += len(board_label_ids)
+            creates["lists"] += len(board_index["lists"])
+            creates["cards"] += len(board_index["cards"])
+            other_planka["label_lookups"] += 1
+            board_chains.append(1 + len(board_label_ids) + len(board_index["lists"]))
+            if crawl:
+                trello["crawl"] += 2 + sum(len(card["comments"]) for card in board_index["cards"].values()) // 1000 # bundle and comment pages
+
+            for card in board_index["cards"].values():
+                bindings = [label for label in card.get("labels", []) if label["id"] in board_label_ids]
+                uploads = [attachment for attachment in card["attachments"] if attachment.get("isUpload", True)]
+                tasks = sum(len(checklist["checkItems"]) for checklist in card["checklists"])
+                card_bytes = sum(attachment.get("bytes") or 0 for attachment in uploads)
+
+                creates["label_bindings"] += len(bindings)
+                creates["tasks"] += tasks
+                creates["comments"] += len(card["comments"])
+                creates["attachments"] += len(uploads)
+                trello["downloads"] += len(uploads) # link attachments are not downloaded at all
+                attachment_bytes += card_bytes
+                link_attachments += len(card["attachments"]) - len(uploads)
+                if card["attachments"]:
+                    other_planka["cover_updates"] += 1 # the cover is set once the attachments of the card are uploaded
+
+                card_jobs.append((1, 0)) # the card itself, created concurrently with the other cards
+                card_jobs += [(1, 0)] * len(bindings)
+                card_jobs += [(tasks, 0), (len(card["comments"]), 0)]
+                for attachment in uploads:
+                    size = attachment.get("bytes")
+                    lane = "small" if size is not None and size < ATTACHMENT_LARGE_BYTES else "large"
+                    attachment_jobs[lane].append((2, size or 0))
+
+    planka_requests = sum(creates.values()) + sum(other_planka.values())
+    trello_requests = sum(trello.values())
+    bandwidth = PLAN_BANDWIDTH_MB_PER_SECOND * 1024 * 1024
+    job_seconds = [requests * PLAN_REQUEST_SECONDS + size / bandwidth for requests, size in card_jobs if requests]
+    lane_seconds = {lane: [requests * PLAN_REQUEST_SECONDS + size / bandwidth for requests, size in jobs] for lane, jobs in attachment_jobs.items()}
+    board_workers = processes if processes > 1 else BOARD_WORKERS # each worker process migrates one board at a time
+
+    bounds = {
+        "Planka rate limit": planka_requests / PLANKA_REQUESTS_PER_SECOND,
+        "Trello rate limit": trello_requests / (TRELLO_REQUESTS_PER_10_SECONDS / 10),
+        "lists of the boards": (creates["projects"] + creates["boards"]) * PLAN_REQUEST_SECONDS
+            + schedule_length([chain * PLAN_REQUEST_SECONDS for chain in board_chains], board_workers),
+        "card contents": schedule_length(job_seconds, CARD_ITEM_WORKERS * processes),
+        "attachment lanes": max(schedule_length(lane_seconds["small"], ATTACHMENT_SMALL_WORKERS * processes),
+                                schedule_length(lane_seconds["large"], ATTACHMENT_LARGE_WORKERS * processes)),
+        "attachment bandwidth": attachment_bytes / bandwidth,
+    }
+    limit = max(bounds, key=bounds.get)
+
+    return {
+        "creates": creates,
+        "other_planka_requests": other_planka,
+        "planka_requests": planka_requests,
+        "trello_requests": trello,
+        "attachment_bytes": attachment_bytes,
+        "link_attachments": link_attachments,
+        "bounds": bounds,
+        "limited_by": limit,
+        "projected_seconds": bounds[limit],
+    }
+
+# Function: formats a plan as report lines
+def plan_lines(plan):
+    creates = plan["creates"]
+    other = plan["other_planka_requests"]
+    trello = plan["trello_requests"]
+    lines = ["\nMigration plan (nothing is written to Planka):"]
+    lines += [f"Planka {name.replace('_', ' ')} to create: {creates[name]}" for name in PLAN_TYPES]
+    lines.append(f"Other Planka requests: {other['login']} login, {other['label_lookups']} label lookups, {other['cover_updates']} cover updates")
+    lines.append(f"Total Planka requests: {plan['planka_requests']}")
+    lines.append(f"Trello requests: {trello['crawl']} to read the boards, {trello['downloads']} attachment downloads")
+    lines.append(f"Attachment bytes: {plan['attachment_bytes']} ({plan['attachment_bytes'] / 1024 / 1024:.1f} MB)")
+    if plan["link_attachments"]:
+        lines.append(f"Link attachments (cannot be uploaded to Planka): {plan['link_attachments']}")
+    for name, seconds in plan["bounds"].items():
+        lines.append(f"Time needed by {name}: {datetime.timedelta(seconds=round(seconds))}")
+    lines.append(f"Projected duration: {datetime.timedelta(seconds=round(plan['projected_seconds']))} (limited by {plan['limited_by']})")
+    return lines
\ No newline at end of file
@@ -0,0 +1,154 @@
+import email.utils
+import random
+import threading
+import time
+import requests
+from collections import deque
+import urllib3
+from config import TRELLO_REQUESTS_PER_10_SECONDS, TRELLO_KEY_REQUESTS_PER_10_SECONDS, PLANKA_REQUESTS_PER_SECOND, MAX_RETRIES
+from utils import log_message
+from metrics import record_request
+from metrics import record_retry
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A POST creates an object, and one that reached the server may have done so even if its answer was lost. It is sent again only
+# when the server surely has not processed it: throttled or unavailable (429, 503), or not connected at all
+NON_IDEMPOTENT_METHODS = {"POST"}
+NON_IDEMPOTENT_RETRY_STATUSES = {429, 503}
+BACKOFF_BASE = 1.0 # seconds before the first retry when the server gives no hint, doubled on every attempt
+BACKOFF_MAX = 60.0
+
+# Token bucket shared by all threads that talk to one server. The rate is halved on every throttling response and
+# grows back to the configured maximum while requests succeed, so the migration runs as fast as the server allows.
+# A server that counts requests per fixed period (window_limit requests in any window seconds) also gets a sliding window:
+# a full bucket plus its refill could otherwise exceed that count
+class TokenBucket:
+    def __init__(self, name, rate, capacity, window_limit=None, window=None):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = rate / 20
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.window_limit = window_limit
+        self.window = window
+        self.sent = deque() # send times of the requests inside the window
+        self.lock = threading.Lock()
+
+    # Function: changes the configured rate (e.g. to share the limit of a server between several processes)
+    def set_rate(self, rate):
+        with self.lock:
+            self.capacity = max(1, self.capacity * rate / self.max_rate) # the burst stays as long in seconds
+            self.tokens = min(self.tokens, self.capacity)
+            if self.window_limit:
+                self.window_limit = max(1, int(self.window_limit * rate / self.max_rate))
+            self.max_rate = rate
+            self.min_rate = rate / 20
+            self.rate = rate
+
+    # Function: waits until a request may be sent
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.sent and self.sent[0] <= now - self.window:
+                    self.sent.popleft()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.window_limit and len(self.sent) >= self.window_limit:
+                    wait = self.sent[0] + self.window - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        if self.window_limit:
+                            self.sent.append(now)
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    # Function: stops all requests to the server for delay seconds and lowers the rate
+    def throttle(self, delay):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.updated = max(self.updated, self.paused_until)
+            self.tokens = 0
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    # Function: raises the rate back towards the configured maximum after a successful request
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+# Trello counts requests per 10 seconds per token and per API key: the bucket spreads them evenly (a burst of one second at most),
+# and the window keeps any 10 seconds within the lower of both limits. Planka's limit depends on the server
+trello_bucket = TokenBucket("Trello", TRELLO_REQUESTS_PER_10_SECONDS / 10, max(1, TRELLO_REQUESTS_PER_10_SECONDS / 10),
+                            window_limit=min(TRELLO_REQUESTS_PER_10_SECONDS, TRELLO_KEY_REQUESTS_PER_10_SECONDS), window=10)
+planka_bucket = TokenBucket("Planka", PLANKA_REQUESTS_PER_SECOND, PLANKA_REQUESTS_PER_SECOND)
+
+# Function: returns the pause requested by the server in the Retry-After or Trello rate limit headers (None if there is no hint)
+def get_retry_delay(response):
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        if retry_after.strip().isdigit():
+            return float(retry_after)
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    for scope in ("token", "key"):
+        remaining = response.headers.get(f"x-rate-limit-api-{scope}-remaining")
+        interval = response.headers.get(f"x-rate-limit-api-{scope}-interval-ms")
+        if remaining == "0" and interval:
+            return int(interval) / 1000
+
+    return None
+
+# Function: checks whether a connection error happened before the request was sent (connect timeout or refused connection)
+def is_unsent(error):
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+# Function: sends a request with the session through the bucket of the server, retrying 429, 5xx and connection errors with backoff and jitter
+# (a POST only when it has surely not been processed, see NON_IDEMPOTENT_METHODS)
+def send_request(session, bucket, method, url, max_retries=MAX_RETRIES, **kwargs):
+    idempotent = method.upper() not in NON_IDEMPOTENT_METHODS
+    for attempt in range(max_retries + 1):
+        for file in kwargs.get("files", {}).values():
+            file = file[1] if isinstance(file, tuple) else file
+            file.seek(0) # the file of a failed upload is sent again from the beginning
+
+        bucket.acquire()
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            record_request(bucket.name, method, url, type(e).__name__, time.monotonic() - started)
+            if attempt == max_retries or not (idempotent or is_unsent(e)):
+                raise
+            delay = None
+            reason = str(e)
+            record_retry(bucket.name, method, url, type(e).__name__)
+        else:
+            record_request(bucket.name, method, url, response.status_code, time.monotonic() - started)
+            retry_statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+            if response.status_code not in retry_statuses or attempt == max_retries:
+                if response.ok:
+                    bucket.recover()
+                return response
+            delay = get_retry_delay(response)
+            reason = f"{response.status_code} {response.reason}"
+            record_retry(bucket.name, method, url, str(response.status_code))
+            response.close()
+
+        if delay is None:
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        delay += random.uniform(0, delay / 4 + 0.1) # jitter, so that parallel threads do not retry at the same moment
+        log_message(f"{bucket.name} request {method} {url} failed ({reason}), retry {attempt + 1}/{max_retries} in {delay:.1f} sec", "WARNING")
+        bucket.throttle(delay)
\ No newline at end of file
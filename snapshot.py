@@ -0,0 +1,61 @@
+import zlib
+import requests
+from tqdm import tqdm
+from trello_api import get_workspaces
+from trello_api import get_boards
+from trello_api import get_board_index
+from utils import log_message
+
+# Function: crawls the Trello tree once (workspaces -> boards -> board index) and returns it as a snapshot shared by counting and migration.
+# Without with_index only the workspaces and boards are read; the boards are then streamed during the migration (--stream)
+def crawl_trello(with_index=True):
+    snapshot = {"workspaces": []}
+
+    for ws in tqdm(get_workspaces(), desc="Reading Trello workspaces"):
+        ws["boards"] = []
+        for board in tqdm(get_boards(ws["id"]), desc="Reading boards", leave=False):
+            if not with_index:
+                ws["boards"].append(board)
+                continue
+            try:
+                board["index"] = get_board_index(board["id"])
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code == 404:
+                    log_message(f"A deleted board was missed: {board['name']} ({board['id']})", "WARNING")
+                    continue
+                else:
+                    raise
+            ws["boards"].append(board)
+        snapshot["workspaces"].append(ws)
+
+    return snapshot
+
+
+# Function: checks whether a workspace or board is selected by include/exclude lists of names or ids (no include list selects all)
+def is_selected(item, names, include=None, exclude=None):
+    keys = {item["id"], *names}
+    if include and not keys & set(include):
+        return False
+    return not (exclude and keys & set(exclude))
+
+# Function: keeps only the workspaces and boards selected by the include/exclude lists (workspaces left without boards are dropped)
+def filter_snapshot(snapshot, include_workspaces=None, exclude_workspaces=None, include_boards=None, exclude_boards=None):
+    workspaces = []
+    for ws in snapshot["workspaces"]:
+        if not is_selected(ws, (ws.get("name"), ws.get("displayName")), include_workspaces, exclude_workspaces):
+            continue
+        boards = [{**board, "seq": board.get("seq", i)} for i, board in enumerate(ws["boards"]) # seq keeps the Planka position of the board
+                  if is_selected(board, (board.get("name"),), include_boards, exclude_boards)]
+        if boards:
+            workspaces.append({**ws, "boards": boards})
+    return {**snapshot, "workspaces": workspaces}
+
+# Function: keeps the boards of one shard out of count (shards are numbered from 0). The shard of a board depends only on its id,
+# so hosts that crawled Trello separately still split the boards the same way
+def shard_snapshot(snapshot, index, count):
+    workspaces = []
+    for ws in snapshot["workspaces"]:
+        boards = [{**board, "seq": board.get("seq", i)} for i, board in enumerate(ws["boards"]) # the boards of all shards get the same positions
+                  if zlib.crc32(board["id"].encode("ascii")) % count == index]
+        workspaces.append({**ws, "boards": boards}) # every shard keeps all workspaces, so the projects are known everywhere
+    return {**snapshot, "workspaces": workspaces}
\ No newline at end of file
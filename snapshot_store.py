@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+from trello_api import build_board_index
+from utils import BASE_DIR
+from utils import log_message
+
+# Default location of the offline copy of the Trello data
+SNAPSHOT_FILE = os.path.join(BASE_DIR, "trello_snapshot.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (id TEXT PRIMARY KEY, seq INTEGER, data TEXT);
+CREATE TABLE IF NOT EXISTS boards (id TEXT PRIMARY KEY, workspace_id TEXT, seq INTEGER, data TEXT);
+CREATE TABLE IF NOT EXISTS lists (id TEXT PRIMARY KEY, board_id TEXT, pos REAL, data TEXT);
+CREATE TABLE IF NOT EXISTS labels (id TEXT PRIMARY KEY, board_id TEXT, seq INTEGER, data TEXT);
+CREATE TABLE IF NOT EXISTS cards (id TEXT PRIMARY KEY, board_id TEXT, list_id TEXT, pos REAL, data TEXT);
+CREATE TABLE IF NOT EXISTS attachments (id TEXT PRIMARY KEY, card_id TEXT, seq INTEGER, data TEXT);
+CREATE TABLE IF NOT EXISTS checklists (id TEXT PRIMARY KEY, card_id TEXT, pos REAL, data TEXT);
+CREATE TABLE IF NOT EXISTS comments (id TEXT PRIMARY KEY, board_id TEXT, card_id TEXT, seq INTEGER, data TEXT);
+CREATE INDEX IF NOT EXISTS idx_boards_workspace ON boards (workspace_id, seq);
+CREATE INDEX IF NOT EXISTS idx_lists_board ON lists (board_id, pos);
+CREATE INDEX IF NOT EXISTS idx_labels_board ON labels (board_id, seq);
+CREATE INDEX IF NOT EXISTS idx_cards_board ON cards (board_id, pos);
+CREATE INDEX IF NOT EXISTS idx_cards_list ON cards (list_id, pos);
+CREATE INDEX IF NOT EXISTS idx_attachments_card ON attachments (card_id, seq);
+CREATE INDEX IF NOT EXISTS idx_checklists_card ON checklists (card_id, pos);
+CREATE INDEX IF NOT EXISTS idx_comments_board ON comments (board_id, seq);
+CREATE INDEX IF NOT EXISTS idx_comments_card ON comments (card_id, seq);
+"""
+
+# Function: opens (and creates if necessary) the snapshot database
+def open_store(path=SNAPSHOT_FILE):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+# Function: copies a dictionary without the nested collections that are stored in their own tables
+def strip_keys(item, *keys):
+    return {key: value for key, value in item.items() if key not in keys}
+
+# Function: saves a Trello snapshot (see snapshot.crawl_trello) into a SQLite file, replacing its previous contents
+def save_snapshot(snapshot, path=SNAPSHOT_FILE):
+    connection = open_store(path)
+    with connection:
+        for table in ("workspaces", "boards", "lists", "labels", "cards", "attachments", "checklists", "comments"):
+            connection.execute(f"DELETE FROM {table}")
+
+        for ws_seq, ws in enumerate(snapshot["workspaces"]):
+            connection.execute("INSERT INTO workspaces VALUES (?, ?, ?)", (ws["id"], ws_seq, json.dumps(strip_keys(ws, "boards"))))
+
+            for board_seq, board in enumerate(ws["boards"]):
+                board_index = board["index"]
+                connection.execute("INSERT INTO boards VALUES (?, ?, ?, ?)",
+                                   (board["id"], ws["id"], board_seq, json.dumps(strip_keys(board, "index"))))
+                connection.executemany("INSERT INTO lists VALUES (?, ?, ?, ?)",
+                                       [(lst["id"], board["id"], lst.get("pos", 0), json.dumps(lst)) for lst in board_index["lists"]])
+                connection.executemany("INSERT INTO labels VALUES (?, ?, ?, ?)",
+                                       [(label["id"], board["id"], seq, json.dumps(label)) for seq, label in enumerate(board_index["labels"])])
+
+                for card in board_index["cards"].values():
+                    connection.execute("INSERT INTO cards VALUES (?, ?, ?, ?, ?)",
+                                       (card["id"], board["id"], card["idList"], card.get("pos", 0),
+                                        json.dumps(strip_keys(card, "attachments", "checklists", "comments"))))
+                    connection.executemany("INSERT INTO attachments VALUES (?, ?, ?, ?)",
+                                           [(a["id"], card["id"], seq, json.dumps(a)) for seq, a in enumerate(card["attachments"])])
+                    connection.executemany("INSERT INTO checklists VALUES (?, ?, ?, ?)",
+                                           [(c["id"], card["id"], c.get("pos", 0), json.dumps(c)) for c in card["checklists"]])
+                    connection.executemany("INSERT OR IGNORE INTO comments VALUES (?, ?, ?, ?, ?)",
+                                           [(c["id"], board["id"], card["id"], seq, json.dumps(c)) for seq, c in enumerate(card["comments"])])
+    connection.close()
+    log_message(f"Trello snapshot saved to {path}")
+
+# Function: loads a snapshot saved by save_snapshot, so the migration can run without calling the Trello API
+def load_snapshot(path=SNAPSHOT_FILE):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Error: snapshot file {path} does not exist")
+
+    connection = open_store(path)
+
+    def rows(query, *args):
+        return [json.loads(row[0]) for row in connection.execute(query, args)]
+
+    snapshot = {"workspaces": []}
+    for ws in rows("SELECT data FROM workspaces ORDER BY seq"):
+        ws["boards"] = []
+        for board in rows("SELECT data FROM boards WHERE workspace_id = ? ORDER BY seq", ws["id"]):
+            cards = rows("SELECT data FROM cards WHERE board_id = ? ORDER BY pos", board["id"])
+            for card in cards:
+                card["attachments"] = rows("SELECT data FROM attachments WHERE card_id = ? ORDER BY seq", card["id"])
+            checklists = rows("SELECT c.data FROM checklists c JOIN cards ON cards.id = c.card_id WHERE cards.board_id = ? ORDER BY c.pos", board["id"])
+            bundle = {
+                "lists": rows("SELECT data FROM lists WHERE board_id = ? ORDER BY pos", board["id"]),
+                "labels": rows("SELECT data FROM labels WHERE board_id = ? ORDER BY seq", board["id"]),
+                "cards": cards,
+                "checklists": checklists
+            }
+            comments = rows("SELECT data FROM comments WHERE board_id = ? ORDER BY card_id, seq", board["id"])
+            board["index"] = build_board_index(bundle, comments)
+            ws["boards"].append(board)
+        snapshot["workspaces"].append(ws)
+
+    connection.close()
+    log_message(f"Trello snapshot loaded from {path}")
+    return snapshot
+
+# Function: builds a snapshot from Trello's own board JSON exports (Board menu -> Print, export and share -> Export as JSON)
+def import_trello_export(export_paths, workspace_name="Trello export"):
+    workspaces = {}
+
+    for export_path in export_paths:
+        with open(export_path, encoding="utf-8") as f:
+            export = json.load(f)
+
+        ws_id = export.get("idOrganization") or "trello-export"
+        ws = workspaces.setdefault(ws_id, {"id": ws_id, "name": ws_id, "displayName": workspace_name, "boards": []})
+
+        lists = [lst for lst in export.get("lists", []) if not lst.get("closed")]
+        cards = [card for card in export.get("cards", []) if not card.get("closed")]
+        comments = [action for action in export.get("actions", []) if action.get("type") in ("commentCard", "copyCard")]
+        bundle = {"lists": lists, "cards": cards, "checklists": export.get("checklists", []), "labels": export.get("labels", [])}
+
+        board = {"id": export["id"], "name": export["name"], "index": build_board_index(bundle, comments)}
+        ws["boards"].append(board)
+        log_message(f"Imported the Trello export of the board {board['name']} from {export_path}")
+
+    return {"workspaces": list(workspaces.values())}
\ No newline at end of file
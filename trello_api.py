@@ -1,80 +1,213 @@
-import requests
-from config import TRELLO_URL, APIKEY, APITOKEN
+import json
+import os
+import sqlite3
+import tempfile
+import urllib.parse
+from config import COPY_SOURCE_COMMENTS
+from config import STREAM_CARD_PAGE_SIZE
+from http_client import trello_client
+
+# Largest page of actions Trello returns
+ACTIONS_PAGE_SIZE = 1000
 
 # Function: get a list of Trello workspaces
 def get_workspaces():
-    url = f"{TRELLO_URL}members/me/organizations"
-    params = {"key": APIKEY, "token": APITOKEN}
-    response = requests.get(url, params=params)
+    response = trello_client.request("GET", "members/me/organizations")
     response.raise_for_status()
     return response.json()
 
 # Function: get list of boards from Trello
 def get_boards(workspace_id):
-    url = f"{TRELLO_URL}organizations/{workspace_id}/boards"
-    params = {"key": APIKEY, "token": APITOKEN}
-    response = requests.get(url, params=params)
+    response = trello_client.request("GET", f"organizations/{workspace_id}/boards")
     response.raise_for_status()
     return response.json()
 
-# Function: retrieve list from Trello
-def get_lists(board_id):
-    url = f"{TRELLO_URL}boards/{board_id}/lists"
-    params = {"key": APIKEY, "token": APITOKEN}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
-
-# Function: retrieve cards from Trello
-def get_cards(list_id):
-    url = f"{TRELLO_URL}lists/{list_id}/cards"
-    params = {"key": APIKEY, "token": APITOKEN}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
-
-# Function: get attachments from cards from Trello
-def get_card_attachments(card_id, APIKEY, APITOKEN):
-    url = f"https://api.trello.com/1/cards/{card_id}/attachments"
+# Function: retrieves a whole board in one request (open lists, open cards with attachments inline, checklists and labels)
+def get_board_bundle(board_id):
+    url = f"boards/{board_id}"
     params = {
-        "key": APIKEY,
-        "token": APITOKEN
+        "fields": "id,name",
+        "lists": "open",
+        "cards": "open",
+        "card_attachments": "true",
+        "checklists": "all",
+        "labels": "all",
+        "labels_limit": 1000
     }
-    response = requests.get(url, params=params)
+    response = trello_client.request("GET", url, params=params)
     response.raise_for_status()
     return response.json()
 
-# Function: gets the ID of an attachment that is a card cover in Trello to transfer it as a cover to a card in Planka
-def get_card_cover_attachment_id(card_id):
-    url = f"{TRELLO_URL}cards/{card_id}"
-    params = {"key": APIKEY, "token": APITOKEN, "fields": "idAttachmentCover"}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json().get("idAttachmentCover")
+# Function: pages through the actions of a board of the given types (newest first), only those after since if it is set
+def iter_board_actions(board_id, action_filter, since=None):
+    url = f"boards/{board_id}/actions"
+    params = {"filter": action_filter, "limit": ACTIONS_PAGE_SIZE}
+    if since:
+        params["since"] = since
 
-# Function: retrieves all checklists (task list) from a Trello card
-def get_card_checklists(card_id):
-    url = f"{TRELLO_URL}cards/{card_id}/checklists"
-    params = {"key": APIKEY, "token": APITOKEN}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    while True:
+        response = trello_client.request("GET", url, params=params)
+        response.raise_for_status()
+        actions = response.json()
+
+        yield actions
+        if len(actions) < params["limit"]:
+            break
+
+        params["before"] = actions[-1]["id"]
+
+# Function: retrieves the actions of a board of the given types (newest first), only those after since if it is set
+def get_board_actions(board_id, action_filter, since=None):
+    return [action for actions in iter_board_actions(board_id, action_filter, since) for action in actions]
+
+# Function: retrieves all comments of a board in pages of board-level actions, together with the copyCard actions that
+# tell which cards are copies of which (see group_comments)
+def get_board_comments(board_id):
+    return get_board_actions(board_id, "commentCard,copyCard")
 
-# Function: retrieves card comments from Trello
-def get_card_comments(card_id):
-    url = f"{TRELLO_URL}cards/{card_id}/actions"
-    params = {"key": APIKEY, "token": APITOKEN, "filter": "commentCard", "limit": 50}
+# Function: groups the commentCard actions of a board by card (newest first, each action once even if pages overlap).
+# Trello does not copy the comments of a card it duplicates; with COPY_SOURCE_COMMENTS a copy gets the comments its source
+# card had at the time of the copy, under ids of their own, unless the copy already has a comment with the same text
+def group_comments(actions):
+    comments_by_card = {}
+    seen = set()
+    copies = []
+    for action in actions:
+        card = action.get("data", {}).get("card")
+        if not card or action["id"] in seen:
+            continue
+        seen.add(action["id"])
+        if action.get("type", "commentCard") == "commentCard":
+            comments_by_card.setdefault(card["id"], []).append(action)
+        elif action["type"] == "copyCard" and action["data"].get("cardSource"):
+            copies.append(action)
 
-    all_comments = []
+    if COPY_SOURCE_COMMENTS:
+        for copy in sorted(copies, key=lambda action: action["date"]): # a copy of a copy gets the comments inherited by its source
+            card_id = copy["data"]["card"]["id"]
+            own_texts = {comment["data"]["text"] for comment in comments_by_card.get(card_id, [])}
+            inherited = [
+                {**comment, "id": f"{comment['id']}-{card_id}", "data": {**comment["data"], "card": copy["data"]["card"]}}
+                for comment in comments_by_card.get(copy["data"]["cardSource"]["id"], [])
+                if comment["date"] < copy["date"] and comment["data"]["text"] not in own_texts
+            ]
+            if inherited:
+                comments_by_card[card_id] = sorted(comments_by_card.get(card_id, []) + inherited, key=lambda c: c["date"], reverse=True)
+
+    return comments_by_card
+
+# Function: builds an in-memory index of a board keyed by card id (checklists and comments are attached to their cards);
+# comments are the board's commentCard and copyCard actions
+def build_board_index(board, comments):
+    lists = sorted(board.get("lists", []), key=lambda lst: lst.get("pos", 0))
+    list_ids = {lst["id"] for lst in lists}
+
+    checklists_by_card = {}
+    for checklist in board.get("checklists", []):
+        checklist["checkItems"] = sorted(checklist.get("checkItems", []), key=lambda item: item.get("pos", 0))
+        checklists_by_card.setdefault(checklist["idCard"], []).append(checklist)
+
+    comments_by_card = group_comments(comments)
+
+    cards = {}
+    cards_by_list = {lst["id"]: [] for lst in lists}
+    for card in sorted(board.get("cards", []), key=lambda c: c.get("pos", 0)):
+        if card["idList"] not in list_ids:
+            continue  # cards of archived lists are not migrated
+        card.setdefault("attachments", [])
+        card["checklists"] = sorted(checklists_by_card.get(card["id"], []), key=lambda c: c.get("pos", 0))
+        card["comments"] = comments_by_card.get(card["id"], [])
+        cards[card["id"]] = card
+        cards_by_list[card["idList"]].append(card)
+
+    return {"lists": lists, "labels": board.get("labels", []), "cards_by_list": cards_by_list, "cards": cards}
+
+# Function: retrieves the open lists (in their order) and the labels of a board, without its cards
+def get_board_skeleton(board_id):
+    params = {"fields": "id,name", "lists": "open", "labels": "all", "labels_limit": 1000}
+    response = trello_client.request("GET", f"boards/{board_id}", params=params)
+    response.raise_for_status()
+    board = response.json()
+    board["lists"] = sorted(board.get("lists", []), key=lambda lst: lst.get("pos", 0))
+    return board
+
+# Function: pages through the open cards of a board (newest first, STREAM_CARD_PAGE_SIZE at a time) with their attachments and checklists
+def iter_board_cards(board_id, page_size=STREAM_CARD_PAGE_SIZE):
+    params = {"attachments": "true", "checklists": "all", "limit": page_size}
     while True:
-        response = requests.get(url, params=params)
+        response = trello_client.request("GET", f"boards/{board_id}/cards", params=params)
         response.raise_for_status()
-        comments = response.json()
+        cards = response.json()
 
-        if not comments:
+        yield cards
+        if len(cards) < page_size:
             break
 
-        all_comments.extend(comments)
-        params["before"] = comments[-1]["id"]
+        params["before"] = cards[-1]["id"]
 
-    return all_comments
\ No newline at end of file
+# Comments and copyCard actions of one board spooled to a temporary SQLite file, so the comments of a card can be looked up
+# while the cards are streamed without holding all comments of the board in memory
+class CommentSpool:
+    def __init__(self, board_id):
+        self.directory = tempfile.TemporaryDirectory(prefix="comments_")
+        self.connection = sqlite3.connect(os.path.join(self.directory.name, "comments.sqlite3"), check_same_thread=False)
+        self.connection.execute("CREATE TABLE actions (id TEXT PRIMARY KEY, card_id TEXT, type TEXT, data TEXT)")
+        for actions in iter_board_actions(board_id, "commentCard,copyCard"):
+            self.connection.executemany("INSERT OR IGNORE INTO actions VALUES (?, ?, ?, ?)",
+                                        [(a["id"], a["data"]["card"]["id"], a["type"], json.dumps(a)) for a in actions if a.get("data", {}).get("card")])
+        self.connection.execute("CREATE INDEX idx_actions_card ON actions (card_id)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+        self.directory.cleanup()
+
+    # Function: returns the actions of a card (newest first), of the given type if set
+    def actions(self, card_id, action_type=None):
+        query = "SELECT data FROM actions WHERE card_id = ?" + (" AND type = ?" if action_type else "") + " ORDER BY rowid"
+        return [json.loads(row[0]) for row in self.connection.execute(query, (card_id, action_type) if action_type else (card_id,))]
+
+    # Function: returns the comments of a card as build_board_index attaches them: the actions of the whole copy chain of the card
+    # (its source, the source of that source, ...) are read, so a copy of a copy inherits what its source inherited
+    def comments(self, card_id):
+        actions = []
+        pending, visited = [card_id], set()
+        while pending:
+            current = pending.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            card_actions = self.actions(current)
+            actions += card_actions
+            pending += [action["data"]["cardSource"]["id"] for action in card_actions
+                        if action["type"] == "copyCard" and action["data"].get("cardSource")]
+        return group_comments(actions).get(card_id, [])
+
+# Function: streams the cards of a board one bundle at a time (a card with its attachments, sorted checklists and comments) for the
+# cards of the given open lists; only one page of cards is held in memory
+def iter_card_bundles(board_id, list_ids, spool):
+    for cards in iter_board_cards(board_id):
+        for card in cards:
+            if card["idList"] not in list_ids:
+                continue # cards of archived lists are not migrated
+            card.setdefault("attachments", [])
+            for checklist in card.get("checklists", []):
+                checklist["checkItems"] = sorted(checklist.get("checkItems", []), key=lambda item: item.get("pos", 0))
+            card["checklists"] = sorted(card.get("checklists", []), key=lambda c: c.get("pos", 0))
+            card["comments"] = spool.comments(card["id"])
+            yield card
+
+# Function: fetches a board with all nested resources and comments and returns its index
+def get_board_index(board_id):
+    board = get_board_bundle(board_id)
+    comments = get_board_comments(board_id)
+    return build_board_index(board, comments)
+
+# Function: starts a streamed download of a card attachment from Trello (the caller reads and closes the response)
+def download_attachment(card_id, attachment_id, file_name):
+    url = f"cards/{card_id}/attachments/{attachment_id}/download/{urllib.parse.quote(file_name)}"
+    response = trello_client.request("GET", url, headers=trello_client.download_headers, stream=True)
+    response.raise_for_status()
+    return response
\ No newline at end of file
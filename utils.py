@@ -1,52 +1,145 @@
-import requests
-from tqdm import tqdm
+import atexit
+import collections
+import datetime
+import json
 import os
-from trello_api import get_workspaces
-from trello_api import get_workspaces
-from trello_api import get_boards
-from trello_api import get_lists
-from trello_api import get_cards
-from trello_api import get_card_attachments
-from trello_api import get_card_comments
-from config import PLANKA_URL, USERNAME, PASSWORD, APIKEY, APITOKEN
-
-# Function: authorisation and receipt of Bearer token for Planka
-def get_token():
-    url = f"{PLANKA_URL}/access-tokens"
-    payload = {"emailOrUsername": USERNAME, "password": PASSWORD}
-    response = requests.post(url, json=payload)
-    response.raise_for_status()
-    return response.json()["item"]
-
-# Function: logging messages to a log file and output to the console
+import queue
+import threading
+import time
+from config import LOG_LEVEL, CONSOLE_LOG_LEVEL, LOG_JSON, PROGRESS_INTERVAL
+from metrics import dashboard_line
+from metrics import export_metrics
+
+# Logging: messages and events are queued by the migration threads and written by one background thread that keeps
+# the log files open, so the hot loop never opens files or prints a line per object
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(BASE_DIR, "log.txt")
-def log_message(message):
+LOG_JSON_FILE = os.path.join(BASE_DIR, "log.jsonl")
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LOG_STOP = object()
+
+log_queue = queue.Queue()
+progress = collections.Counter() # events by "object type outcome", shown in the console summary
+progress_lock = threading.Lock()
+progress_started = time.monotonic()
+progress_total = 0 # objects expected in the run, for the ETA
+progress_console = True # False in worker processes, whose progress is reported by the coordinator
+
+# Function: logging messages to the log file; only messages of CONSOLE_LOG_LEVEL and above (or with console=True) are printed
+def log_message(message, level="INFO", console=False):
+    if LOG_LEVELS[level] < LOG_LEVELS[LOG_LEVEL] and not console:
+        return
+    print_it = console or LOG_LEVELS[level] >= LOG_LEVELS[CONSOLE_LOG_LEVEL]
+    log_queue.put(("text", f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} {level} {message}", message if print_it else None))
+
+# Function: records the outcome of one object (created, skipped, failed) as a JSON Lines event and counts it for the progress summary
+def log_event(object_type, trello_id, planka_id, duration, outcome, **fields):
+    with progress_lock:
+        progress[f"{object_type} {outcome}"] += 1
+    if LOG_JSON:
+        event = {"time": datetime.datetime.now().isoformat(timespec="milliseconds"), "object_type": object_type,
+                 "trello_id": trello_id, "planka_id": planka_id, "duration": round(duration, 4), "outcome": outcome, **fields}
+        log_queue.put(("json", json.dumps(event, ensure_ascii=False), None))
+
+# Function: sets the number of objects the run is expected to transfer (used for the ETA)
+def set_progress_total(total):
+    global progress_total
+    progress_total = total
+
+# Function: returns the progress summary line (objects per type and outcome, objects per second, ETA and request rates)
+def progress_summary():
+    with progress_lock:
+        counts = dict(progress)
+    elapsed = time.monotonic() - progress_started
+    done = sum(counts.values())
+    rate = done / elapsed if elapsed else 0
+    eta = ""
+    if progress_total and rate:
+        remaining = max(progress_total - done, 0) / rate
+        eta = f" of {progress_total}, ETA {int(remaining // 3600)}:{int(remaining % 3600 // 60):02d}:{int(remaining % 60):02d}"
+    details = ", ".join(f"{key}: {value}" for key, value in sorted(counts.items()))
+    return f"Progress: {done} objects{eta}, {rate:.1f}/sec, {dashboard_line()} ({details})"
+
+# Function: returns the progress counters gathered since the last call and resets them (a worker process hands them to the coordinator)
+def take_progress():
+    with progress_lock:
+        counts = dict(progress)
+        progress.clear()
+    return counts
+
+# Function: adds the progress counters of a worker process to this process
+def merge_progress(counts):
+    with progress_lock:
+        progress.update(counts)
+
+# Function: background writer of the log files; prints the progress summary at most every PROGRESS_INTERVAL seconds
+def log_writer():
+    json_log = open(LOG_JSON_FILE, "a", encoding="utf-8") if LOG_JSON else None
     with open(LOG_FILE, "a", encoding="utf-8") as log:
-        log.write(message + "\n")
-    print(message)
-
-# Function: counts the number of items in Trello to check the transfer totals
-def count_trello_items():
-    items = {"workspaces": 0, "boards": 0, "lists": 0, "cards": 0, "attachments": 0, "comments": 0}
-    
-    workspaces = get_workspaces()
-    items["workspaces"] = len(workspaces)
-
-    for ws in tqdm(workspaces, desc="Board count"):  
-        boards = get_boards(ws["id"])
-        items["boards"] += len(boards)
-
-        for board in tqdm(boards, desc="Counting lists", leave=False):  
-            lists = get_lists(board["id"])
-            items["lists"] += len(lists)
-
-            for lst in tqdm(lists, desc="Card counting", leave=False):  
-                cards = get_cards(lst["id"])
-                items["cards"] += len(cards)
-
-                for card in tqdm(cards, desc="Counting attachments and comments", leave=False):  
-                    items["attachments"] += len(get_card_attachments(card["id"], APIKEY, APITOKEN))
-                    items["comments"] += len(get_card_comments(card["id"]))
+        last_progress = time.monotonic()
+        while True:
+            try:
+                record = log_queue.get(timeout=1)
+            except queue.Empty:
+                record = None
+            if record is LOG_STOP:
+                break
+            if record:
+                kind, line, console_text = record
+                (json_log if kind == "json" else log).write(line + "\n")
+                if console_text is not None:
+                    print(console_text)
+            if log_queue.empty():
+                log.flush()
+                if json_log:
+                    json_log.flush()
+            if progress_console and progress and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                print(progress_summary())
+                export_metrics()
+                last_progress = time.monotonic()
+    if json_log:
+        json_log.close()
+
+# Function: writes everything that is still queued and stops the writer (called at exit)
+def flush_log():
+    if log_thread.is_alive():
+        log_queue.put(LOG_STOP)
+        log_thread.join()
+
+log_thread = threading.Thread(target=log_writer, name="log-writer", daemon=True)
+log_thread.start()
+atexit.register(flush_log)
+
+# Function: moves the logging of a worker process to its own files (log.<name>.txt, log.<name>.jsonl) and leaves the console to the coordinator
+def start_worker_log(name):
+    global LOG_FILE, LOG_JSON_FILE, log_thread, progress_console
+    flush_log()
+    LOG_FILE = os.path.join(BASE_DIR, f"log.{name}.txt")
+    LOG_JSON_FILE = os.path.join(BASE_DIR, f"log.{name}.jsonl")
+    progress_console = False
+    log_thread = threading.Thread(target=log_writer, name="log-writer", daemon=True)
+    log_thread.start()
+
+# Function: counts the number of items in a Trello snapshot to check the transfer totals
+def count_trello_items(snapshot):
+    items = {"workspaces": 0, "boards": 0, "lists": 0, "cards": 0, "attachments": 0, "comments": 0, "tasks": 0, "labels": 0, "label_bindings": 0}
+
+    for ws in snapshot["workspaces"]:
+        items["workspaces"] += 1
+        items["boards"] += len(ws["boards"])
+
+        for board in ws["boards"]:
+            board_index = board.get("index")
+            if board_index is None:
+                continue # a board streamed during the migration (--stream) is counted while it is transferred
+            items["lists"] += len(board_index["lists"])
+            items["cards"] += len(board_index["cards"])
+            items["labels"] += len(board_index["labels"])
+
+            for card in board_index["cards"].values():
+                items["attachments"] += len(card["attachments"])
+                items["comments"] += len(card["comments"])
+                items["tasks"] += sum(len(checklist["checkItems"]) for checklist in card["checklists"])
+                items["label_bindings"] += len(card.get("labels", []))
 
     return items
\ No newline at end of file
@@ -0,0 +1,132 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from config import BOARD_WORKERS, CARD_ITEM_WORKERS
+from utils import log_message
+from utils import log_event
+from journal import journal
+from journal import fingerprint
+from journal import JOURNAL_FILE
+from planka_backend import get_board
+from planka_backend import get_card_comments
+from planka_backend import connect
+from planka_api import format_comment
+
+# Function: normalises a due date of Trello or Planka to UTC seconds, so both sides hash the same
+def normalize_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(datetime.timezone.utc).isoformat(timespec="seconds")
+    except ValueError:
+        return value
+
+# Function: compares one Trello object with its Planka copy by content hash; returns the problem ("missing" or "different") or None
+def compare(planka_items, object_type, trello_id, expected, actual):
+    planka_id = journal.lookup(object_type, trello_id)
+    item = planka_items.get(planka_id) if planka_id else None
+    if item is None:
+        return "missing"
+    if expected is not None and fingerprint(*expected) != fingerprint(*actual(item)):
+        return "different"
+    return None
+
+# Function: compares one migrated board with its Trello snapshot and returns its problems as (object type, Trello id, name, problem).
+# The board and its lists, cards, labels, tasks and attachments come from one request; comments are read for the cards that have some
+def verify_board(board, comment_executor):
+    problems = []
+    board_planka_id = journal.lookup("board", board['id'])
+    try:
+        included = get_board(board_planka_id)["included"] if board_planka_id else {}
+    except Exception as e:
+        if getattr(getattr(e, "response", None), "status_code", None) != 404:
+            raise
+        included = {} # the board has been deleted in Planka: everything in it is missing
+    if not included:
+        problems.append(("board", board['id'], board['name'], "missing"))
+
+    by_id = {name: {item["id"]: item for item in included.get(name, [])} for name in ("lists", "cards", "labels", "tasks", "attachments")}
+    card_labels = {(item["cardId"], item["labelId"]) for item in included.get("cardLabels", [])}
+    board_index = board['index']
+
+    def check(object_type, trello_id, name, items, expected=None, actual=None):
+        problem = compare(items, object_type, trello_id, expected, actual)
+        if problem:
+            problems.append((object_type, trello_id, name, problem))
+        return problem
+
+    for label in board_index['labels']:
+        check("label", label['id'], label.get('name') or label.get('color'), by_id["labels"])
+    for lst in board_index['lists']:
+        check("list", lst['id'], lst['name'], by_id["lists"], (lst['name'],), lambda item: (item["name"],))
+
+    comment_jobs = []
+    for card in board_index['cards'].values():
+        list_planka_id = journal.lookup("list", card['idList'])
+        card_problem = check("card", card['id'], card['name'], by_id["cards"],
+                             (card['name'], card.get('desc') or "", normalize_date(card.get('due')), card.get('dueComplete', False), list_planka_id),
+                             lambda item: (item["name"], item.get("description") or "", normalize_date(item.get("dueDate")),
+                                           item.get("isDueDateCompleted", False), item["listId"]))
+
+        for checklist in card['checklists']:
+            for item in checklist['checkItems']:
+                check("task", item['id'], item['name'], by_id["tasks"], (item['name'], item['state'] == "complete"),
+                      lambda task: (task["name"], task.get("isCompleted", False)))
+        for attachment in card['attachments']:
+            if attachment.get("isUpload", True): # link attachments are never transferred
+                check("attachment", attachment['id'], attachment.get('name'), by_id["attachments"])
+        card_planka_id = journal.lookup("card", card['id'])
+        for label in card.get('labels', []):
+            label_planka_id = journal.lookup("label", label['id'])
+            if (card_planka_id, label_planka_id) not in card_labels:
+                problems.append(("card_label", f"{card['id']}_{label_planka_id}", f"{card['name']}: {label.get('name') or label.get('color')}", "missing"))
+
+        if card['comments']:
+            if card_problem == "missing":
+                problems += [("comment", comment['id'], card['name'], "missing") for comment in card['comments']]
+            else:
+                comment_jobs.append((card, comment_executor.submit(get_card_comments, card_planka_id)))
+
+    for card, future in comment_jobs:
+        comments = {comment["id"]: comment for comment in future.result()}
+        for comment in card['comments']:
+            expected = format_comment(comment['data']['text'], comment['memberCreator']['fullName'], comment['memberCreator']['username'], comment['date'])
+            check("comment", comment['id'], card['name'], comments, (expected,), lambda item: (item["data"]["text"],))
+
+    log_event("board", board['id'], board_planka_id, 0, "verified" if not problems else "different", problems=len(problems))
+    return problems
+
+# Function: records the problems of a board in the journal, so that a --resume run transfers exactly those objects again:
+# missing objects are forgotten, different ones lose their fingerprint (they are updated), and the board is no longer done
+def mark_for_migration(board, problems):
+    for object_type, trello_id, _, problem in problems:
+        if problem == "missing":
+            journal.forget(object_type, trello_id)
+        else:
+            journal.clear_fingerprint(object_type, trello_id)
+    if problems:
+        journal.mark_undone("board", board['id'])
+
+# Reconciliation: compares every migrated board of the snapshot with Planka, in parallel, lists the cards, comments, files and other
+# objects that are missing or different, and prepares the journal so that `--resume` re-migrates only those
+def verify_workspaces(snapshot, journal_path=JOURNAL_FILE):
+    connect()
+    journal.open(journal_path, resume=True) # the Trello -> Planka id map of the migration
+
+    boards = [board for ws in snapshot["workspaces"] for board in ws['boards']]
+    with ThreadPoolExecutor(max_workers=BOARD_WORKERS) as board_executor, ThreadPoolExecutor(max_workers=CARD_ITEM_WORKERS) as comment_executor:
+        results = list(board_executor.map(lambda board: (board, verify_board(board, comment_executor)), boards))
+
+    totals = {}
+    for board, problems in results:
+        for object_type, trello_id, name, problem in problems:
+            log_message(f"{problem.capitalize()} in Planka: {object_type} {name} ({trello_id}) of the board {board['name']}", "WARNING")
+            totals[(object_type, problem)] = totals.get((object_type, problem), 0) + 1
+        mark_for_migration(board, problems)
+
+    log_message("\nVerification complete!", console=True)
+    log_message(f"Boards verified: {len(boards)}, boards with problems: {sum(1 for _, problems in results if problems)}", console=True)
+    for (object_type, problem), count in sorted(totals.items()):
+        log_message(f"{object_type.replace('_', ' ').capitalize()}s {problem}: {count}", console=True)
+    if totals:
+        log_message("Run python main.py --resume to transfer only these objects again", console=True)
+    return results
\ No newline at end of file